@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import contextlib
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+import zlib
+from types import SimpleNamespace
+from typing import Any, Iterator, Mapping, Sequence
+
+from adx_export import Column, json_default
+
+DEFAULT_CACHE_PATH = "~/.cache/adx_query/results.sqlite3"
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access);
+"""
+
+
+def normalize_kql(kql: str) -> str:
+    """Canonical form of a query for cache keys.
+
+    Collapses whitespace and drops `//` comments and trailing `;` outside string
+    literals. Literal contents and identifier case are preserved (KQL is case-sensitive).
+    """
+    out: list[str] = []
+    i, n = 0, len(kql)
+    pending_space = False
+    while i < n:
+        ch = kql[i]
+        if kql.startswith("```", i):
+            end = kql.find("```", i + 3)
+            end = n if end < 0 else end + 3
+            literal, i = kql[i:end], end
+        elif ch in ("'", '"'):
+            # Verbatim strings (@'...') have no escapes; the `@` was already emitted.
+            verbatim = i > 0 and kql[i - 1] == "@"
+            j = i + 1
+            while j < n and kql[j] != ch:
+                j += 2 if (kql[j] == "\\" and not verbatim) else 1
+            literal, i = kql[i : j + 1], j + 1
+        elif kql.startswith("//", i):
+            end = kql.find("\n", i)
+            i = n if end < 0 else end
+            pending_space = True
+            continue
+        elif ch.isspace():
+            pending_space = True
+            i += 1
+            continue
+        else:
+            literal, i = ch, i + 1
+
+        if pending_space and out:
+            out.append(" ")
+        pending_space = False
+        out.append(literal)
+
+    return "".join(out).rstrip("; ")
+
+
+def cache_key(cluster_url: str, database: str, kql: str, options: Mapping[str, Any] | None = None) -> str:
+    """Key for a query result. `options` are the request properties that shape the result
+    (server timeout, truncation limits): the same query under different limits is a different entry."""
+    material = "\n".join([
+        cluster_url.rstrip("/").lower(),
+        database,
+        normalize_kql(kql),
+        json.dumps(dict(options or {}), sort_keys=True, default=str),
+    ])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class CachedResult(list):
+    """Rows served from the cache, shaped like a Kusto result table (iterable rows + `.columns`)."""
+
+    def __init__(self, columns: Sequence[Column], rows: list[list[Any]], age: float = 0.0) -> None:
+        super().__init__(rows)
+        self.columns = [SimpleNamespace(column_name=name, column_type=ctype) for name, ctype in columns]
+        self.age = age
+
+
+# Values JSON can't hold, by the kind recorded for their column: (type, encode, decode).
+# datetime comes before date, which it subclasses.
+_VALUE_KINDS = {
+    "datetime": (datetime.datetime, datetime.datetime.isoformat, datetime.datetime.fromisoformat),
+    "date": (datetime.date, datetime.date.isoformat, datetime.date.fromisoformat),
+    "timespan": (
+        datetime.timedelta,
+        lambda v: v // datetime.timedelta(microseconds=1),
+        lambda v: datetime.timedelta(microseconds=v),
+    ),
+    "decimal": (decimal.Decimal, str, decimal.Decimal),
+    "guid": (uuid.UUID, str, uuid.UUID),
+}
+
+
+def _value_kind(rows: list[list[Any]], i: int) -> str | None:
+    """The _VALUE_KINDS entry for column i, from its first non-null value (None: plain JSON)."""
+    value = next((row[i] for row in rows if row[i] is not None), None)
+    for kind, (cls, _, _) in _VALUE_KINDS.items():
+        if isinstance(value, cls):
+            return kind
+    return None
+
+
+def _encode_rows(kinds: Sequence[str | None], rows: list[list[Any]]) -> list[list[Any]]:
+    encoders = [(i, _VALUE_KINDS[kind][1]) for i, kind in enumerate(kinds) if kind]
+    if not encoders:
+        return rows
+    encoded = []
+    for row in rows:
+        row = list(row)
+        for i, encode in encoders:
+            if row[i] is not None:
+                row[i] = encode(row[i])
+        encoded.append(row)
+    return encoded
+
+
+def _decode_rows(kinds: Sequence[str | None], rows: list[list[Any]]) -> list[list[Any]]:
+    """Restore the values _encode_rows turned into strings or numbers, so a hit matches the live result."""
+    decoders = [(i, _VALUE_KINDS[kind][2]) for i, kind in enumerate(kinds) if kind in _VALUE_KINDS]
+    for row in rows:
+        for i, decode in decoders:
+            if row[i] is not None:
+                row[i] = decode(row[i])
+    return rows
+
+
+class ResultCache:
+    """Size-bounded, TTL-expiring LRU of query results in a local SQLite file.
+
+    A fresh connection is opened per call so the cache can be shared by fan-out threads
+    and by concurrent CLI processes.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.path = os.path.expanduser(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> CachedResult | None:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT created_at, payload FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            created_at, payload = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+
+        data = json.loads(zlib.decompress(payload))
+        columns = [tuple(c) for c in data["columns"]]
+        return CachedResult(columns, _decode_rows(data["kinds"], data["rows"]), age=now - created_at)
+
+    def put(self, key: str, columns: Sequence[Column], rows: list[list[Any]]) -> None:
+        kinds = [_value_kind(rows, i) for i in range(len(columns))]
+        raw = json.dumps(
+            {"columns": list(columns), "kinds": kinds, "rows": _encode_rows(kinds, rows)},
+            separators=(",", ":"),
+            default=json_default,
+        )
+        payload = zlib.compress(raw.encode("utf-8"))
+        if len(payload) > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, created_at, last_access, size, payload) VALUES (?, ?, ?, ?, ?)",
+                (key, now, now, len(payload), payload),
+            )
+            conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least-recently-used entries until the total payload size fits in max_bytes."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_access ASC").fetchall():
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
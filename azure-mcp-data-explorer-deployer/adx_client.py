@@ -1,19 +1,19 @@
 from __future__ import annotations
 
 import datetime
+import json
 import os
-from typing import Any
+from typing import TYPE_CHECKING, Any, Sequence
 
-from azure.identity import (
-    AuthenticationRecord,
-    AzureCliCredential,
-    DefaultAzureCredential,
-    DeviceCodeCredential,
-    TokenCachePersistenceOptions,
-)
-from azure.kusto.data import KustoClient, KustoConnectionStringBuilder
+# The Azure SDKs (and asyncio / urllib / concurrent.futures) are imported inside the
+# functions that need them: they dominate start-up time, and `--help` or a cache hit
+# should not pay for them.
+if TYPE_CHECKING:
+    from azure.kusto.data import KustoClient
 
 KUSTO_SCOPE = "https://kusto.kusto.windows.net/.default"
+ARM_ENDPOINT = os.getenv("ADX_ARM_ENDPOINT", "https://management.azure.com")
+ARM_SCOPE = ARM_ENDPOINT.rstrip("/") + "/.default"
 
 # In-process cache (single Python run)
 _CACHED_CREDENTIAL: Any | None = None
@@ -69,6 +69,13 @@ def get_credential() -> Any:
     if _CACHED_CREDENTIAL is not None:
         return _CACHED_CREDENTIAL
 
+    from azure.identity import (
+        AuthenticationRecord,
+        AzureCliCredential,
+        DeviceCodeCredential,
+        TokenCachePersistenceOptions,
+    )
+
     # Device code auth w/ persistence settings
     allow_unencrypted = _bool_env("ADX_ALLOW_UNENCRYPTED_CACHE", default=True)
     cache_name = os.getenv("ADX_TOKEN_CACHE_NAME", "adx_token_cache")
@@ -141,11 +148,160 @@ def get_credential() -> Any:
 
 
 def get_kusto_client(cluster_url: str) -> KustoClient:
+    from azure.kusto.data import KustoClient, KustoConnectionStringBuilder
+
     credential = get_credential()
     kcsb = KustoConnectionStringBuilder.with_azure_token_credential(cluster_url, credential)
     return KustoClient(kcsb)
 
 
+class _AsyncCredential:
+    """Expose the cached (sync) credential through the async `get_token` protocol.
+
+    Reusing `get_credential()` keeps a single auth flow and token cache for both client
+    paths; token refreshes run in a worker thread so they never block the event loop.
+    `close()` is a no-op on purpose: the aio client closes its credential on exit, and
+    the shared one must outlive it.
+    """
+
+    def __init__(self, credential: Any) -> None:
+        self._credential = credential
+
+    async def get_token(self, *scopes: str, **kwargs: Any) -> Any:
+        import asyncio
+
+        return await asyncio.to_thread(self._credential.get_token, *scopes, **kwargs)
+
+    async def close(self) -> None:
+        return None
+
+    async def __aenter__(self) -> "_AsyncCredential":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        return None
+
+
+def get_async_kusto_client(cluster_url: str) -> Any:
+    """Async counterpart of `get_kusto_client` (needs `azure-kusto-data[aio]`).
+
+    Call it before starting concurrent work: the first call may prompt for device-code auth.
+    """
+    from azure.kusto.data import KustoConnectionStringBuilder
+    from azure.kusto.data.aio import KustoClient as AsyncKustoClient
+
+    credential = _AsyncCredential(get_credential())
+    kcsb = KustoConnectionStringBuilder.with_azure_token_credential(cluster_url, credential)
+    return AsyncKustoClient(kcsb)
+
+
+async def run_queries_async(
+    cluster_url: str,
+    database: str,
+    queries: Sequence[str],
+    concurrency: int = 8,
+) -> list[Any]:
+    """Run `queries` concurrently, at most `concurrency` in flight.
+
+    Returns one entry per query, in order: the primary result table, or the exception
+    that query raised (one failure doesn't cancel the others).
+    """
+    import asyncio
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    client = get_async_kusto_client(cluster_url)
+
+    async def run_one(query: str) -> Any:
+        async with semaphore:
+            resp = await client.execute(database, query)
+            return resp.primary_results[0]
+
+    async with client:
+        return await asyncio.gather(*(run_one(q) for q in queries), return_exceptions=True)
+
+
+def run_queries(cluster_url: str, database: str, queries: Sequence[str], concurrency: int = 8) -> list[Any]:
+    """Blocking wrapper around `run_queries_async` for scripts that aren't async themselves."""
+    import asyncio
+
+    return asyncio.run(run_queries_async(cluster_url, database, queries, concurrency))
+
+
+def fetch_table_schemas(
+    cluster_url: str,
+    database: str,
+    tables: Sequence[str],
+    concurrency: int = 8,
+) -> dict[str, Any]:
+    """Fetch `.show table ... schema as json` for many tables concurrently.
+
+    Returns {table: parsed schema dict} (OrderedColumns holds Name/Type/CslType),
+    or {table: exception} for tables whose lookup failed.
+    """
+    queries = [f".show table {kql_table_ref(t)} schema as json" for t in tables]
+    schemas: dict[str, Any] = {}
+    for table, result in zip(tables, run_queries(cluster_url, database, queries, concurrency)):
+        if isinstance(result, BaseException):
+            schemas[table] = result
+            continue
+        rows = list(result)
+        schemas[table] = json.loads(rows[0]["Schema"]) if rows else {}
+    return schemas
+
+
+def _arm_list(url: str, token: str) -> list[dict[str, Any]]:
+    """GET an ARM collection, following `nextLink` pages."""
+    import urllib.error
+    import urllib.request
+
+    items: list[dict[str, Any]] = []
+    while url:
+        request = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as resp:
+                page = json.load(resp)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", "replace")[:500]
+            raise SystemExit(f"Azure Resource Manager request failed ({e.code}): {url}\n{detail}") from e
+        except urllib.error.URLError as e:
+            raise SystemExit(f"Could not reach Azure Resource Manager at {ARM_ENDPOINT}: {e.reason}") from e
+        items.extend(page.get("value", []))
+        url = page.get("nextLink")
+    return items
+
+
+def list_kusto_clusters(max_workers: int = 8) -> list[dict[str, Any]]:
+    """List ADX clusters in every subscription the signed-in identity can see.
+
+    Calls the ARM REST API directly with the cached credential instead of spawning
+    `az kusto cluster list`. Items are ARM cluster resources, with `subscriptionId`
+    and `resourceGroup` filled in from the resource id (as the Azure CLI does).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    token = get_credential().get_token(ARM_SCOPE).token
+    base = ARM_ENDPOINT.rstrip("/")
+    subscriptions = _arm_list(f"{base}/subscriptions?api-version=2022-12-01", token)
+
+    def clusters_in(subscription_id: str) -> list[dict[str, Any]]:
+        url = f"{base}/subscriptions/{subscription_id}/providers/Microsoft.Kusto/clusters?api-version=2023-08-15"
+        return _arm_list(url, token)
+
+    subscription_ids = [s["subscriptionId"] for s in subscriptions if s.get("subscriptionId")]
+    clusters: list[dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        for subscription_id, found in zip(subscription_ids, pool.map(clusters_in, subscription_ids)):
+            for cluster in found:
+                # /subscriptions/<sub>/resourceGroups/<rg>/providers/Microsoft.Kusto/clusters/<name>
+                segments = (cluster.get("id") or "").split("/")
+                lowered = [seg.lower() for seg in segments]
+                if "resourcegroups" in lowered:
+                    cluster.setdefault("resourceGroup", segments[lowered.index("resourcegroups") + 1])
+                cluster.setdefault("subscriptionId", subscription_id)
+                clusters.append(cluster)
+    return clusters
+
+
 def kql_table_ref(table_name: str) -> str:
     """Safely reference tables with special characters (e.g., `hello-world`)."""
     escaped = table_name.replace("'", "''")
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import decimal
+import json
+import sys
+from typing import IO, Any, Iterable, Sequence
+
+FORMATS = ("table", "csv", "ndjson", "parquet")
+
+# Rows buffered per Parquet row group. Keeps memory flat regardless of result size.
+PARQUET_BATCH_ROWS = 10_000
+
+# (column name, Kusto column type), e.g. ("Timestamp", "datetime")
+Column = tuple[str, str]
+
+
+def result_columns(result: Any) -> list[Column]:
+    """Column (name, type) pairs for a materialized or streaming Kusto result table."""
+    return [(c.column_name, c.column_type) for c in result.columns]
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"), default=json_default)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    # timespan (timedelta), guid (UUID) and anything else the SDK hands back.
+    return str(value)
+
+
+class ResultWriter:
+    """Write result rows one at a time. Subclasses never hold more than a batch in memory."""
+
+    def __init__(self, out: IO[Any], columns: Sequence[Column]) -> None:
+        self.out = out
+        self.columns = list(columns)
+        self.rows = 0
+
+    def write_row(self, row: Sequence[Any]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        if self.out not in (sys.stdout, sys.stdout.buffer):
+            self.out.close()
+        else:
+            self.out.flush()
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class TableWriter(ResultWriter):
+    """The original ` | ` separated console output."""
+
+    def __init__(self, out: IO[str], columns: Sequence[Column]) -> None:
+        super().__init__(out, columns)
+        out.write(" | ".join(name for name, _ in self.columns) + "\n")
+
+    def write_row(self, row: Sequence[Any]) -> None:
+        self.out.write(" | ".join(str(v) for v in row) + "\n")
+        self.rows += 1
+
+
+class CsvWriter(ResultWriter):
+    def __init__(self, out: IO[str], columns: Sequence[Column]) -> None:
+        super().__init__(out, columns)
+        self._csv = csv.writer(out)
+        self._csv.writerow([name for name, _ in self.columns])
+
+    def write_row(self, row: Sequence[Any]) -> None:
+        self._csv.writerow([_text(v) for v in row])
+        self.rows += 1
+
+
+class NdjsonWriter(ResultWriter):
+    def __init__(self, out: IO[str], columns: Sequence[Column]) -> None:
+        super().__init__(out, columns)
+        self._names = [name for name, _ in self.columns]
+
+    def write_row(self, row: Sequence[Any]) -> None:
+        record = dict(zip(self._names, row))
+        self.out.write(json.dumps(record, separators=(",", ":"), default=json_default) + "\n")
+        self.rows += 1
+
+
+class ParquetWriter(ResultWriter):
+    """Buffer up to PARQUET_BATCH_ROWS rows, then flush them as one row group."""
+
+    def __init__(self, out: IO[bytes], columns: Sequence[Column]) -> None:
+        super().__init__(out, columns)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise SystemExit("Parquet output requires pyarrow. Install it with: pip install pyarrow") from e
+
+        self._pa = pa
+        self._types = [_arrow_type(pa, kusto_type) for _, kusto_type in self.columns]
+        self._schema = pa.schema([(name, t) for (name, _), t in zip(self.columns, self._types)])
+        self._writer = pq.ParquetWriter(out, self._schema)
+        self._batch: list[list[Any]] = [[] for _ in self.columns]
+
+    def write_row(self, row: Sequence[Any]) -> None:
+        for i, value in enumerate(row):
+            if value is not None and self._types[i] == self._pa.string():
+                value = _text(value)
+            self._batch[i].append(value)
+        self.rows += 1
+        if len(self._batch[0]) >= PARQUET_BATCH_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._batch or not self._batch[0]:
+            return
+        self._writer.write_batch(self._pa.record_batch(self._batch, schema=self._schema))
+        self._batch = [[] for _ in self.columns]
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+        super().close()
+
+
+def _arrow_type(pa: Any, kusto_type: str) -> Any:
+    mapping = {
+        "bool": pa.bool_(),
+        "boolean": pa.bool_(),
+        "int": pa.int32(),
+        "long": pa.int64(),
+        "real": pa.float64(),
+        "double": pa.float64(),
+        "datetime": pa.timestamp("us", tz="UTC"),
+    }
+    # string, guid, timespan, decimal and dynamic are written as text.
+    return mapping.get((kusto_type or "").lower(), pa.string())
+
+
+_WRITERS = {
+    "table": TableWriter,
+    "csv": CsvWriter,
+    "ndjson": NdjsonWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def open_writer(fmt: str, columns: Sequence[Column], path: str | None = None) -> ResultWriter:
+    """Open an incremental writer for `fmt`, targeting `path` (or stdout when None / "-")."""
+    if fmt not in _WRITERS:
+        raise SystemExit(f"Unknown output format {fmt!r}. Choose one of: {', '.join(FORMATS)}")
+
+    to_stdout = path is None or path == "-"
+    if fmt == "parquet":
+        if to_stdout:
+            raise SystemExit("Parquet output needs a file. Pass --output PATH.")
+        out: IO[Any] = open(path, "wb")
+    elif to_stdout:
+        out = sys.stdout
+    else:
+        out = open(path, "w", encoding="utf-8", newline="")
+
+    return _WRITERS[fmt](out, columns)
+
+
+def write_rows(writer: ResultWriter, rows: Iterable[Sequence[Any]]) -> int:
+    """Drain `rows` into `writer` without materializing them. Returns the row count."""
+    for row in rows:
+        writer.write_row(list(row))
+    return writer.rows
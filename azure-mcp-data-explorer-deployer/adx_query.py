@@ -1,13 +1,26 @@
 from __future__ import annotations
 
 import argparse
+import datetime
 import os
 import re
 import json
-import subprocess
-from typing import Any
-
-from adx_client import get_kusto_client, kql_table_ref
+import sys
+import threading
+import time
+from typing import Any, Callable
+
+from adx_cache import (
+    DEFAULT_CACHE_PATH,
+    DEFAULT_MAX_BYTES,
+    DEFAULT_TTL_SECONDS,
+    CachedResult,
+    ResultCache,
+    cache_key,
+    normalize_kql,
+)
+from adx_client import fetch_table_schemas, get_kusto_client, kql_table_ref, list_kusto_clusters
+from adx_export import FORMATS, open_writer, result_columns, write_rows
 
 
 def _require(value: str | None, name: str) -> str:
@@ -41,59 +54,426 @@ def _looks_like_management_or_write(kql: str) -> bool:
     return any(marker in lowered for marker in write_markers)
 
 
-def _run_az_json(args: list[str]) -> Any:
-    try:
-        proc = subprocess.run(
-            ["az", *args, "-o", "json"],
-            check=False,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
+def _check_read_only(kql: str, allow_admin: bool) -> None:
+    if not allow_admin and _looks_like_management_or_write(kql):
+        raise SystemExit(
+            "Refusing to run management/write KQL without --allow-admin. "
+            "If you intend to run admin commands, re-run with --allow-admin."
         )
-    except FileNotFoundError as e:
-        raise SystemExit("Azure CLI ('az') not found on PATH. Install Azure CLI or run in Codespaces.") from e
 
-    if proc.returncode != 0:
-        stderr = (proc.stderr or "").strip()
-        raise SystemExit(
-            "Azure CLI command failed. If you are not logged in, run `az login` first.\n"
-            f"Command: az {' '.join(args)} -o json\n"
-            f"Error: {stderr}"
+
+# Operators that already bound the number of rows a query returns.
+_ROW_LIMITING_OPERATORS = {"take", "limit", "top", "sample", "count", "top-nested", "top-hitters"}
+_TABLE_REF = re.compile(r"^(?:[A-Za-z_][\w]*|\['(?:[^']|'')+'\]|\[\"(?:[^\"])+\"\])$")
+
+
+def _split_top_level(text: str, sep: str) -> list[str]:
+    """Split `text` on `sep`, ignoring separators inside string literals and brackets."""
+    parts: list[str] = []
+    depth = 0
+    start = i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if text.startswith("```", i):
+            end = text.find("```", i + 3)
+            i = n if end < 0 else end + 3
+            continue
+        if ch in ("'", '"'):
+            verbatim = i > 0 and text[i - 1] == "@"
+            i += 1
+            while i < n and text[i] != ch:
+                i += 2 if (text[i] == "\\" and not verbatim) else 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        elif ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def apply_guardrails(
+    kql: str,
+    default_take: int,
+    time_column: str | None = None,
+    lookback: str = "1d",
+) -> tuple[str, list[str]]:
+    """Pre-flight rewrite of a read-only query. Returns (query, notes describing what changed).
+
+    - Appends `| take <default_take>` when no stage already bounds the row count (just before
+      a final `render`, which Kusto requires to come last).
+    - With `time_column`, inserts `| where <time_column> > ago(<lookback>)` after the
+      source table when the query never mentions that column.
+
+    Only the last statement (the one producing results) is rewritten; `let` statements
+    before it are left alone. The stages are inspected without comments, but the pipes are
+    inserted into the query as written, so comments and layout reach the server unchanged.
+    """
+    statements = _split_top_level(kql, ";")
+    index = len(statements) - 1
+    while index > 0 and not normalize_kql(statements[index]):
+        index -= 1
+    last = statements[index]
+    stages = _split_top_level(last, "|")
+    code = [normalize_kql(stage) for stage in stages]
+    starts = [0]
+    for stage in stages[:-1]:
+        starts.append(starts[-1] + len(stage) + 1)
+    operators = [stage.split(None, 1)[0].lower() if stage else "" for stage in code]
+    inserts: list[tuple[int, str]] = []  # (offset in `last`, text)
+    notes: list[str] = []
+
+    if time_column and time_column not in " ".join(code):
+        source = code[0]
+        lead = len(stages[0]) - len(stages[0].lstrip())
+        if _TABLE_REF.match(source) and stages[0].startswith(source, lead):
+            inserts.append((lead + len(source), f" | where {time_column} > ago({lookback})"))
+            notes.append(f"added `| where {time_column} > ago({lookback})`")
+        else:
+            notes.append(f"no time filter on {time_column}; source `{source[:40]}` is not a plain table")
+
+    if default_take > 0 and not set(operators[1:]) & _ROW_LIMITING_OPERATORS:
+        if len(stages) > 1 and operators[-1] == "render":
+            inserts.append((starts[-1] - 1, f"| take {default_take} "))
+            notes.append(f"added `| take {default_take}` before `render`")
+        else:
+            end = len(last.rstrip())
+            # A newline keeps a `//` comment on the last line from swallowing the pipe.
+            sep = "\n" if "//" in last[:end].rsplit("\n", 1)[-1] else " "
+            inserts.append((end, f"{sep}| take {default_take}"))
+            notes.append(f"added `| take {default_take}`")
+
+    if not inserts:
+        return kql, notes
+    # Right to left, so earlier offsets stay valid; at equal offsets the later stage goes in first.
+    for at, text in reversed(sorted(inserts, key=lambda insert: insert[0])):
+        last = last[:at] + text + last[at:]
+    statements[index] = last
+    return ";".join(statements), notes
+
+
+# Request properties that change what a query returns, so they are part of its cache key.
+_RESULT_OPTIONS = ("servertimeout", "truncationmaxsize", "truncationmaxrecords")
+
+
+def _request_properties(server_timeout: float, max_result_bytes: int = 0, max_records: int = 0) -> Any:
+    """Client request properties that cap server time and result size for one query."""
+    from azure.kusto.data import ClientRequestProperties
+
+    properties = ClientRequestProperties()
+    if server_timeout > 0:
+        properties.set_option(
+            ClientRequestProperties.request_timeout_option_name, datetime.timedelta(seconds=server_timeout)
         )
+    if max_result_bytes > 0:
+        properties.set_option("truncationmaxsize", max_result_bytes)
+    if max_records > 0:
+        properties.set_option("truncationmaxrecords", max_records)
+    return properties
+
+
+def _query_statistics(resp: Any) -> dict[str, Any] | None:
+    """Pull the server's resource consumption out of the QueryCompletionInformation table."""
+    for table in getattr(resp, "tables", None) or []:
+        kind = f"{getattr(table, 'table_name', '')} {getattr(table, 'table_kind', '')}"
+        if "QueryCompletionInformation" not in kind:
+            continue
+        for row in table:
+            if row["EventTypeName"] != "QueryResourceConsumption":
+                continue
+            payload = row["Payload"]
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            usage = payload.get("resource_usage") or {}
+            scanned = payload.get("input_dataset_statistics") or {}
+            datasets = payload.get("dataset_statistics") or [{}]
+            return {
+                "execution_time": payload.get("ExecutionTime"),
+                "cpu": (usage.get("cpu") or {}).get("total cpu"),
+                "memory_peak_per_node": (usage.get("memory") or {}).get("peak_per_node"),
+                "rows_scanned": (scanned.get("rows") or {}).get("scanned"),
+                "rows_total": (scanned.get("rows") or {}).get("total"),
+                "extents_scanned": (scanned.get("extents") or {}).get("scanned"),
+                "extents_total": (scanned.get("extents") or {}).get("total"),
+                "result_rows": datasets[0].get("table_row_count"),
+                "result_bytes": datasets[0].get("table_size"),
+            }
+    return None
+
+
+def _format_statistics(stats: dict[str, Any]) -> str:
+    def num(value: Any) -> str:
+        return f"{value:,}" if isinstance(value, int) else "?"
+
+    parts = [
+        f"cpu={stats.get('cpu') or '?'}",
+        f"memory_peak={num(stats.get('memory_peak_per_node'))}B",
+        f"rows_scanned={num(stats.get('rows_scanned'))}/{num(stats.get('rows_total'))}",
+        f"extents_scanned={num(stats.get('extents_scanned'))}/{num(stats.get('extents_total'))}",
+        f"result={num(stats.get('result_rows'))} rows/{num(stats.get('result_bytes'))}B",
+    ]
+    if stats.get("execution_time") is not None:
+        parts.insert(0, f"time={stats['execution_time']}s")
+    return " ".join(parts)
+
+
+def _execute(
+    client: Any,
+    database: str,
+    query: str,
+    stream: bool = False,
+    properties: Any = None,
+) -> tuple[Any, dict[str, Any] | None]:
+    """Run `query` and return (primary result table, server query statistics or None).
+
+    With `stream`, rows are pulled from the service progressively instead of being
+    materialized up front, so memory stays flat no matter how many rows come back.
+    Streaming responses don't surface query statistics.
+    """
+    if stream:
+        resp = client.execute_streaming_query(database, query, properties=properties)
+        return next(resp.iter_primary_results()), None
+    resp = client.execute(database, query, properties=properties)
+    return resp.primary_results[0], _query_statistics(resp)
+
+
+def _cached_execute(
+    get_client: Callable[[], Any],
+    cluster_url: str,
+    database: str,
+    query: str,
+    cache: ResultCache | None,
+    properties: Any = None,
+) -> tuple[Any, dict[str, Any] | None]:
+    """Like `_execute`, but answer repeat read-only queries from the local result cache.
+
+    Management/write KQL always goes to the cluster. The client is only created on a
+    cache miss, so a fully cached run never needs to authenticate.
+    """
+    if cache is None or _looks_like_management_or_write(query):
+        return _execute(get_client(), database, query, properties=properties)
+
+    options = {}
+    if properties is not None:
+        options = {name: properties.get_option(name, None) for name in _RESULT_OPTIONS}
+    key = cache_key(cluster_url, database, query, options)
+    hit = cache.get(key)
+    if hit is not None:
+        print(f"(served from local cache, {hit.age:.0f}s old)", file=sys.stderr)
+        return hit, None
+
+    result, stats = _execute(get_client(), database, query, properties=properties)
+    columns = result_columns(result)
+    rows = [list(row) for row in result]
+    cache.put(key, columns, rows)
+    return CachedResult(columns, rows), stats
+
+
+def _open_cache(ttl_seconds: float) -> ResultCache | None:
+    if ttl_seconds <= 0:
+        return None
+    return ResultCache(
+        path=os.getenv("ADX_CACHE_PATH", DEFAULT_CACHE_PATH),
+        ttl_seconds=ttl_seconds,
+        max_bytes=int(os.getenv("ADX_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES))),
+    )
 
-    try:
-        return json.loads(proc.stdout)
-    except json.JSONDecodeError as e:
-        raise SystemExit("Failed to parse Azure CLI JSON output.") from e
 
+def _emit(result: Any, fmt: str, output: str | None) -> int:
+    with open_writer(fmt, result_columns(result), output) as writer:
+        return write_rows(writer, result)
 
-def discover_clusters() -> int:
-    """Discover ADX clusters via Azure Resource Manager (requires Azure RBAC visibility)."""
-    clusters = _run_az_json(["kusto", "cluster", "list"])
-    if not isinstance(clusters, list):
-        raise SystemExit("Unexpected output from `az kusto cluster list`. Expected a JSON array.")
 
-    if not clusters:
-        print("No clusters returned. You may lack Azure RBAC visibility (Reader) to ADX resources.")
-        return 0
+def _list_clusters() -> list[dict[str, str | None]]:
+    """Return ARM-visible ADX clusters as dicts with query_uri/name/location/resource_group/subscription_id."""
+    clusters = list_kusto_clusters()
 
-    print("Discovered ADX clusters (ARM-visible):")
+    found = []
     for c in clusters:
         name = c.get("name")
-        resource_group = c.get("resourceGroup")
-        subscription_id = c.get("subscriptionId")
         location = c.get("location")
         uri = (c.get("properties") or {}).get("uri")
 
         # `properties.uri` is the query endpoint; fall back to a common pattern if missing.
         query_uri = uri or (f"https://{name}.{location}.kusto.windows.net" if name and location else None)
 
-        parts = [p for p in [query_uri, name, location, resource_group, subscription_id] if p]
+        found.append(
+            {
+                "query_uri": query_uri,
+                "name": name,
+                "location": location,
+                "resource_group": c.get("resourceGroup"),
+                "subscription_id": c.get("subscriptionId"),
+            }
+        )
+    return found
+
+
+def discover_clusters() -> int:
+    """Discover ADX clusters via Azure Resource Manager (requires Azure RBAC visibility)."""
+    clusters = _list_clusters()
+
+    if not clusters:
+        print("No clusters returned. You may lack Azure RBAC visibility (Reader) to ADX resources.")
+        return 0
+
+    print("Discovered ADX clusters (ARM-visible):")
+    for c in clusters:
+        keys = ["query_uri", "name", "location", "resource_group", "subscription_id"]
+        parts = [c[k] for k in keys if c[k]]
         print("- " + " | ".join(parts))
 
     return 0
 
 
+def _load_targets(path: str, default_database: str | None) -> list[tuple[str, str]]:
+    """Read fan-out targets: one `<cluster_url> [database]` per line, `#` starts a comment."""
+    targets = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            database = fields[1] if len(fields) > 1 else default_database
+            if not database:
+                raise SystemExit(f"{path}:{lineno}: no database given and ADX_DATABASE is not set")
+            targets.append((fields[0].rstrip("/"), database))
+    return targets
+
+
+def _query_target(
+    get_client: Callable[[], Any],
+    cluster_url: str,
+    database: str,
+    kql: str,
+    cache: ResultCache | None,
+    properties: Any = None,
+) -> dict[str, Any]:
+    """Run `kql` on one target. Failures are captured, never raised, so one bad target can't sink the rest."""
+    started = time.monotonic()
+    outcome: dict[str, Any] = {
+        "cluster": cluster_url,
+        "database": database,
+        "columns": None,
+        "rows": [],
+        "row_count": 0,
+        "stats": None,
+        "error": None,
+    }
+    try:
+        result, outcome["stats"] = _cached_execute(get_client, cluster_url, database, kql, cache, properties)
+        outcome["columns"] = result_columns(result)
+        outcome["rows"] = [list(row) for row in result]
+        outcome["row_count"] = len(outcome["rows"])
+    except Exception as e:  # noqa: BLE001 - isolate per-target failures
+        outcome["error"] = f"{type(e).__name__}: {e}"
+    outcome["elapsed"] = time.monotonic() - started
+    return outcome
+
+
+def _same_columns(expected: list[tuple[str, str]], columns: list[tuple[str, str]], fmt: str) -> bool:
+    """Whether rows with `columns` fit a writer opened with `expected`. Parquet also needs the same types."""
+    if fmt == "parquet":
+        return list(expected) == list(columns)
+    return [name for name, _ in expected] == [name for name, _ in columns]
+
+
+def fanout_query(
+    targets: list[tuple[str, str]],
+    kql: str,
+    fmt: str,
+    output: str | None,
+    max_workers: int = 8,
+    cache: ResultCache | None = None,
+    properties: Any = None,
+) -> int:
+    """Run `kql` against every (cluster, database) target on a bounded thread pool.
+
+    Rows are tagged with `_cluster` and `_database` columns and written as each target
+    finishes. Targets whose columns don't match the first one written are skipped and
+    counted as failed. A per-target timing/error summary goes to stderr.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    # One client per cluster, created on first cache miss. The lock keeps auth to a single prompt.
+    clients: dict[str, Any] = {}
+    clients_lock = threading.Lock()
+
+    def client_for(url: str) -> Any:
+        with clients_lock:
+            if url not in clients:
+                clients[url] = get_kusto_client(url)
+            return clients[url]
+
+    writer = None
+    failures = 0
+    summary = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            futures = [
+                pool.submit(_query_target, lambda url=url: client_for(url), url, database, kql, cache, properties)
+                for url, database in targets
+            ]
+            for future in as_completed(futures):
+                outcome = future.result()
+                summary.append(outcome)
+                if outcome["error"]:
+                    failures += 1
+                    continue
+
+                columns = [("_cluster", "string"), ("_database", "string"), *outcome["columns"]]
+                if writer is None:
+                    writer = open_writer(fmt, columns, output)
+                elif not _same_columns(writer.columns, columns, fmt):
+                    # The output's header/schema is fixed by the first target: skip rather than corrupt it.
+                    failures += 1
+                    outcome["error"] = "columns differ from the first target's, rows not written"
+                    outcome["rows"] = []
+                    continue
+                tag = [outcome["cluster"], outcome["database"]]
+                write_rows(writer, (tag + row for row in outcome["rows"]))
+                outcome["rows"] = []
+    finally:
+        if writer is not None:
+            writer.close()
+
+    print(f"Fan-out summary ({len(targets)} targets, {failures} failed):", file=sys.stderr)
+    for outcome in sorted(summary, key=lambda o: (o["cluster"], o["database"])):
+        status = outcome["error"] or f"{outcome['row_count']} rows"
+        if outcome["stats"]:
+            status += " | " + _format_statistics(outcome["stats"])
+        print(
+            f"- {outcome['cluster']} | {outcome['database']} | {outcome['elapsed']:.2f}s | {status}",
+            file=sys.stderr,
+        )
+
+    return 1 if failures else 0
+
+
+def _preflight(args: argparse.Namespace) -> tuple[str, Any]:
+    """Apply cost guardrails to --kql. Returns (possibly rewritten query, request properties)."""
+    if args.no_guardrails:
+        return args.kql, None
+
+    kql = args.kql
+    # Admin commands are passed through untouched, and --stream exports are expected to be large.
+    if not args.stream and not _looks_like_management_or_write(kql):
+        kql, notes = apply_guardrails(kql, args.default_take, args.time_column, args.lookback)
+        for note in notes:
+            print(f"guardrail: {note} (use --no-guardrails to run the query as written)", file=sys.stderr)
+
+    max_result_bytes = 0 if args.stream else args.max_result_mb * 1024 * 1024
+    return kql, _request_properties(args.server_timeout, max_result_bytes)
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="ADX quick query helper (cached device-code auth)")
     parser.add_argument("--cluster-url", default=os.getenv("ADX_CLUSTER_URL"))
@@ -110,24 +490,131 @@ def main() -> int:
     group.add_argument("--databases", action="store_true", help="List databases you can access")
     group.add_argument("--tables", action="store_true", help="List tables in the database")
     group.add_argument("--sample", metavar="TABLE", help="Sample rows from a table")
+    group.add_argument(
+        "--schema",
+        nargs="*",
+        metavar="TABLE",
+        help="Show column schemas for the given tables (all tables if none given), fetched concurrently",
+    )
     group.add_argument("--kql", metavar="QUERY", help="Run an arbitrary KQL query (read-only by default)")
     group.add_argument(
         "--discover-clusters",
         action="store_true",
-        help="Discover ADX clusters via Azure CLI (requires Azure RBAC visibility)",
+        help="Discover ADX clusters via Azure Resource Manager (requires Azure RBAC visibility)",
     )
 
     parser.add_argument("--limit", type=int, default=2, help="Row limit for --sample")
+
+    # Output: stream rows straight to a file/stdout in a tool-friendly format.
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="table",
+        help="Output format for --sample/--kql (default: table)",
+    )
+    parser.add_argument("--output", metavar="PATH", help="Write results to PATH instead of stdout")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream --kql results progressively instead of loading them into memory first",
+    )
+
+    # Fan-out: run the same --kql against many clusters/databases concurrently.
+    fanout = parser.add_mutually_exclusive_group()
+    fanout.add_argument(
+        "--targets-file",
+        metavar="PATH",
+        help="Run --kql against every `<cluster_url> [database]` line in PATH",
+    )
+    fanout.add_argument(
+        "--fanout-discovered",
+        action="store_true",
+        help="Run --kql against --database on every cluster found by --discover-clusters",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=int(os.getenv("ADX_FANOUT_WORKERS", "8")),
+        help="Concurrent targets for fan-out queries and --schema lookups (default: 8)",
+    )
+
+    # Local result cache for repeated read-only --kql (management/write KQL is never cached).
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=float(os.getenv("ADX_CACHE_TTL", str(DEFAULT_TTL_SECONDS))),
+        help=f"Seconds a cached --kql result stays fresh; 0 disables the cache (default: {DEFAULT_TTL_SECONDS})",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Always query the cluster for --kql")
+
+    # Cost guardrails for --kql: bound rows/time, cap server time and result size.
+    parser.add_argument(
+        "--no-guardrails",
+        action="store_true",
+        help="Run --kql exactly as written (no injected take/time filter, no result size cap)",
+    )
+    parser.add_argument(
+        "--default-take",
+        type=int,
+        default=int(os.getenv("ADX_DEFAULT_TAKE", "10000")),
+        help="Append `| take N` to --kql that has no take/limit/top/count (default: 10000, 0 disables)",
+    )
+    parser.add_argument(
+        "--time-column",
+        default=os.getenv("ADX_TIME_COLUMN"),
+        help="Datetime column to filter on when --kql has no time filter (e.g. Timestamp)",
+    )
+    parser.add_argument(
+        "--lookback",
+        default=os.getenv("ADX_DEFAULT_LOOKBACK", "1d"),
+        help="Timespan for the injected time filter (default: 1d)",
+    )
+    parser.add_argument(
+        "--server-timeout",
+        type=float,
+        default=float(os.getenv("ADX_SERVER_TIMEOUT", "240")),
+        help="Server-side query timeout in seconds (default: 240)",
+    )
+    parser.add_argument(
+        "--max-result-mb",
+        type=int,
+        default=int(os.getenv("ADX_MAX_RESULT_MB", "64")),
+        help="Fail the query if its result exceeds this size (default: 64)",
+    )
     args = parser.parse_args()
+    if args.stream and (args.targets_file or args.fanout_discovered):
+        parser.error("--stream is not supported with --targets-file / --fanout-discovered")
 
     if args.discover_clusters:
         return discover_clusters()
 
-    cluster_url = _require(args.cluster_url, "ADX_CLUSTER_URL")
+    properties = None
+    cache = None
+    if args.kql:
+        _check_read_only(args.kql, args.allow_admin)
+        args.kql, properties = _preflight(args)
+        # Only --kql reads the cache, and --stream bypasses it: nothing else creates the cache file.
+        if not args.no_cache and not args.stream:
+            cache = _open_cache(args.cache_ttl)
+
+    if args.targets_file or args.fanout_discovered:
+        if not args.kql:
+            raise SystemExit("Fan-out (--targets-file / --fanout-discovered) requires --kql.")
+        if args.targets_file:
+            targets = _load_targets(args.targets_file, args.database)
+        else:
+            database = _require(args.database, "ADX_DATABASE")
+            targets = [(c["query_uri"], database) for c in _list_clusters() if c["query_uri"]]
+        if not targets:
+            raise SystemExit("No fan-out targets found.")
+        return fanout_query(
+            targets, args.kql, args.format, args.output, max_workers=args.max_workers, cache=cache, properties=properties
+        )
 
-    client = get_kusto_client(cluster_url)
+    cluster_url = _require(args.cluster_url, "ADX_CLUSTER_URL")
 
     if args.databases:
+        client = get_kusto_client(cluster_url)
         resp = client.execute(database="", query=".show databases")
         print("Databases:")
         for row in resp.primary_results[0]:
@@ -137,35 +624,45 @@ def main() -> int:
     database = _require(args.database, "ADX_DATABASE")
 
     if args.tables:
+        client = get_kusto_client(cluster_url)
         resp = client.execute(database, ".show tables")
         print(f"Tables in {database}:")
         for row in resp.primary_results[0]:
             print(f"- {row[0]}")
         return 0
 
+    if args.schema is not None:
+        tables = args.schema
+        if not tables:
+            resp = get_kusto_client(cluster_url).execute(database, ".show tables")
+            tables = [row[0] for row in resp.primary_results[0]]
+        schemas = fetch_table_schemas(cluster_url, database, tables, concurrency=args.max_workers)
+        for table in tables:
+            schema = schemas[table]
+            print(f"{table}:")
+            if isinstance(schema, BaseException):
+                print(f"  error: {schema}")
+                continue
+            for column in schema.get("OrderedColumns", []):
+                print(f"  - {column.get('Name')}: {column.get('CslType') or column.get('Type')}")
+        return 0
+
     if args.sample:
         query = f"{kql_table_ref(args.sample)} | take {args.limit}"
-        resp = client.execute(database, query)
-        result = resp.primary_results[0]
-        cols = [c.column_name for c in result.columns]
-        print(" | ".join(cols))
-        for row in result:
-            print(" | ".join(str(v) for v in row))
+        result, _ = _execute(get_kusto_client(cluster_url), database, query)
+        _emit(result, args.format, args.output)
         return 0
 
     if args.kql:
-        if not args.allow_admin and _looks_like_management_or_write(args.kql):
-            raise SystemExit(
-                "Refusing to run management/write KQL without --allow-admin. "
-                "If you intend to run admin commands, re-run with --allow-admin."
-            )
-
-        resp = client.execute(database, args.kql)
-        result = resp.primary_results[0]
-        cols = [c.column_name for c in result.columns]
-        print(" | ".join(cols))
-        for row in result:
-            print(" | ".join(str(v) for v in row))
+        client = lambda: get_kusto_client(cluster_url)  # noqa: E731
+        if args.stream:
+            # Streaming results are never cached: they are meant for exports too large to keep.
+            result, stats = _execute(client(), database, args.kql, stream=True, properties=properties)
+        else:
+            result, stats = _cached_execute(client, cluster_url, database, args.kql, cache, properties)
+        _emit(result, args.format, args.output)
+        if stats:
+            print(f"Query statistics: {_format_statistics(stats)}", file=sys.stderr)
         return 0
 
     # Default action: show help-ish hint
@@ -0,0 +1,47 @@
+"""Tests for adx_cache.py: python -m pytest -q azure-mcp-data-explorer-deployer"""
+
+import datetime
+import decimal
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from adx_cache import ResultCache, cache_key  # noqa: E402
+
+
+def test_hit_returns_the_live_value_types(tmp_path):
+    columns = [
+        ("When", "datetime"), ("Took", "timespan"), ("Cost", "decimal"), ("Id", "guid"),
+        ("Ref", "guid"), ("Props", "dynamic"), ("Name", "string"),
+    ]
+    rows = [
+        [
+            datetime.datetime(2024, 5, 1, 12, 30, 0, 123456, tzinfo=datetime.timezone.utc),
+            datetime.timedelta(days=2, hours=3, microseconds=7),
+            decimal.Decimal("12345678901234567890.000000000001"),
+            uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "87654321-4321-8765-4321-876543218765",  # the SDK hands guids back as str
+            {"a": [1, 2]},
+            "x",
+        ],
+        [None] * 7,
+    ]
+    cache = ResultCache(str(tmp_path / "results.sqlite3"))
+    cache.put("k", columns, [list(row) for row in rows])
+
+    hit = cache.get("k")
+    assert [(c.column_name, c.column_type) for c in hit.columns] == columns
+    assert list(hit) == rows
+    assert [type(value) for value in hit[0]] == [type(value) for value in rows[0]]
+
+
+def test_key_covers_result_options():
+    key = cache_key("https://c.kusto.windows.net/", "db", "T | take 10")
+    assert key == cache_key("https://C.kusto.windows.net", "db", "T  | take 10 // same")
+    limited = cache_key("https://c.kusto.windows.net", "db", "T | take 10", {"truncationmaxsize": 1 << 20})
+    assert limited != key
+    assert limited != cache_key("https://c.kusto.windows.net", "db", "T | take 10", {"truncationmaxsize": 2 << 20})
+    timeout = {"servertimeout": datetime.timedelta(seconds=240)}
+    assert cache_key("https://c.kusto.windows.net", "db", "T | take 10", timeout) != key
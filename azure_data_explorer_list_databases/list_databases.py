@@ -5,6 +5,7 @@ This script connects to an Azure Data Explorer (Kusto) cluster and can:
 - list databases you can access
 - list tables in a database
 - sample a few rows from a table
+- show column schemas for every table in a database (fetched concurrently)
 
 Why you kept seeing device-code prompts:
 - Each `python list_databases.py ...` run is a new process.
@@ -21,33 +22,23 @@ import argparse
 import datetime
 import json
 import os
-import subprocess
 import sys
-from typing import Any, List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
-from azure.kusto.data import KustoClient, KustoConnectionStringBuilder
-from azure.identity import (
-    AuthenticationRecord,
-    AzureCliCredential,
-    DefaultAzureCredential,
-    DeviceCodeCredential,
-    TokenCachePersistenceOptions,
-)
+# The Azure SDK modules are imported where they are used, so `--help` and cluster
+# discovery start quickly.
+if TYPE_CHECKING:
+    from azure.kusto.data import KustoClient
 
 
 CLUSTER_URL_DEFAULT = None
 KUSTO_SCOPE = "https://kusto.kusto.windows.net/.default"
+ARM_ENDPOINT = "https://management.azure.com"
+ARM_SCOPE = "https://management.azure.com/.default"
 
 # In-process cache (single Python run)
 _CACHED_CREDENTIAL = None
 
-# Cross-process cache (persists to disk). In a Linux Codespace container there is
-# no OS keychain, so we allow unencrypted storage.
-_CACHE_OPTIONS = TokenCachePersistenceOptions(
-    name="ynot_adx_token_cache",
-    allow_unencrypted_storage=True,
-)
-
 AUTH_RECORD_PATH = os.path.expanduser("~/.azure/ynot_adx_auth_record.json")
 
 
@@ -64,6 +55,21 @@ def get_credential() -> Any:
     if _CACHED_CREDENTIAL is not None:
         return _CACHED_CREDENTIAL
 
+    from azure.identity import (
+        AuthenticationRecord,
+        AzureCliCredential,
+        DefaultAzureCredential,
+        DeviceCodeCredential,
+        TokenCachePersistenceOptions,
+    )
+
+    # Cross-process cache (persists to disk). In a Linux Codespace container there is
+    # no OS keychain, so we allow unencrypted storage.
+    cache_options = TokenCachePersistenceOptions(
+        name="ynot_adx_token_cache",
+        allow_unencrypted_storage=True,
+    )
+
     # 1) Prefer Azure CLI auth if available (no prompts), but this container's
     # `az` is usually not logged in.
     try:
@@ -83,7 +89,7 @@ def get_credential() -> Any:
 
         credential = DeviceCodeCredential(
             prompt_callback=_device_code_prompt,
-            cache_persistence_options=_CACHE_OPTIONS,
+            cache_persistence_options=cache_options,
             authentication_record=auth_record,
         )
 
@@ -108,11 +114,49 @@ def get_credential() -> Any:
 
 
 def _client(cluster_url: str) -> KustoClient:
+    from azure.kusto.data import KustoClient, KustoConnectionStringBuilder
+
     credential = get_credential()
     kcsb = KustoConnectionStringBuilder.with_azure_token_credential(cluster_url, credential)
     return KustoClient(kcsb)
 
 
+# This script is meant to be copied and run on its own, so it keeps its own small async-credential
+# adapter, query runner and ARM paging helper rather than importing the ADX query tool's adx_client.py.
+class _AsyncCredential:
+    """Async `get_token` wrapper around the cached sync credential, for the aio client.
+
+    `close()` does nothing so the aio client can't close the shared credential on exit.
+    """
+
+    def __init__(self, credential: Any) -> None:
+        self._credential = credential
+
+    async def get_token(self, *scopes: str, **kwargs: Any) -> Any:
+        import asyncio
+
+        return await asyncio.to_thread(self._credential.get_token, *scopes, **kwargs)
+
+    async def close(self) -> None:
+        return None
+
+    async def __aenter__(self) -> "_AsyncCredential":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        return None
+
+
+def _async_client(cluster_url: str):
+    """Async KustoClient sharing the cached credential (needs `azure-kusto-data[aio]`)."""
+    from azure.kusto.data import KustoConnectionStringBuilder
+    from azure.kusto.data.aio import KustoClient as AsyncKustoClient
+
+    credential = _AsyncCredential(get_credential())
+    kcsb = KustoConnectionStringBuilder.with_azure_token_credential(cluster_url, credential)
+    return AsyncKustoClient(kcsb)
+
+
 def _extract_database_names(response) -> List[str]:
     """
     Extract database names from a Kusto query response.
@@ -180,38 +224,84 @@ def sample_rows(cluster_url: str, database_name: str, table_name: str, limit: in
     return columns, rows
 
 
-def _run_az_json(args: List[str]) -> Any:
-    """Run an `az ... -o json` command and parse output."""
-    try:
-        proc = subprocess.run(
-            ["az", *args, "-o", "json"],
-            check=False,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-    except FileNotFoundError as e:
-        raise SystemExit("Azure CLI ('az') not found on PATH. Install Azure CLI or run in Codespaces.") from e
-
-    if proc.returncode != 0:
-        stderr = (proc.stderr or "").strip()
-        raise SystemExit(
-            "Azure CLI command failed. If you are not logged in, run `az login` first.\n"
-            f"Command: az {' '.join(args)} -o json\n"
-            f"Error: {stderr}"
-        )
+async def _run_queries(cluster_url: str, database_name: str, queries: List[str], concurrency: int) -> List[Any]:
+    """Run `queries` with at most `concurrency` in flight; the primary result or exception of each, in order."""
+    import asyncio
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    client = _async_client(cluster_url)
+
+    async def run_one(query: str) -> Any:
+        async with semaphore:
+            response = await client.execute(database_name, query)
+            return response.primary_results[0]
+
+    async with client:
+        return await asyncio.gather(*(run_one(q) for q in queries), return_exceptions=True)
 
-    try:
-        return json.loads(proc.stdout)
-    except json.JSONDecodeError as e:
-        raise SystemExit("Failed to parse Azure CLI JSON output.") from e
+
+def get_table_schemas(cluster_url: str, database_name: str, concurrency: int = 8) -> Dict[str, Any]:
+    """
+    Fetch the column schema of every table in a database.
+
+    The `.show table ... schema` lookups run concurrently (at most `concurrency`
+    in flight) instead of one round trip after another.
+
+    Returns:
+        {table name: list of (column name, type)} or {table name: exception}
+    """
+    import asyncio
+
+    tables = get_tables(cluster_url, database_name)
+    print(f"Fetching {len(tables)} table schema(s), {concurrency} at a time")
+    queries = [f".show table {_kusto_table_ref(t)} schema as json" for t in tables]
+    results = asyncio.run(_run_queries(cluster_url, database_name, queries, concurrency))
+
+    schemas: Dict[str, Any] = {}
+    for table_name, result in zip(tables, results):
+        if isinstance(result, BaseException):
+            schemas[table_name] = result
+            continue
+        rows = list(result)
+        schema = json.loads(rows[0]["Schema"]) if rows else {}
+        schemas[table_name] = [
+            (col.get("Name"), col.get("CslType") or col.get("Type")) for col in schema.get("OrderedColumns", [])
+        ]
+    return schemas
+
+
+def _arm_list(url: str, token: str) -> List[Any]:
+    """GET an Azure Resource Manager collection, following `nextLink` pages."""
+    import urllib.error
+    import urllib.request
+
+    items: List[Any] = []
+    while url:
+        request = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as resp:
+                page = json.load(resp)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", "replace")[:500]
+            raise SystemExit(f"Azure Resource Manager request failed ({e.code}): {url}\n{detail}") from e
+        except urllib.error.URLError as e:
+            raise SystemExit(f"Could not reach Azure Resource Manager: {e.reason}") from e
+        items.extend(page.get("value", []))
+        url = page.get("nextLink")
+    return items
 
 
 def discover_clusters() -> int:
-    """Discover ADX clusters via Azure Resource Manager (requires Azure RBAC visibility)."""
-    clusters = _run_az_json(["kusto", "cluster", "list"])
-    if not isinstance(clusters, list):
-        raise SystemExit("Unexpected output from `az kusto cluster list`. Expected a JSON array.")
+    """Discover ADX clusters via Azure Resource Manager (requires Azure RBAC visibility).
+
+    Calls the ARM REST API with the cached credential rather than shelling out to `az`.
+    """
+    token = get_credential().get_token(ARM_SCOPE).token
+    clusters = []
+    for sub in _arm_list(f"{ARM_ENDPOINT}/subscriptions?api-version=2022-12-01", token):
+        subscription_id = sub.get("subscriptionId")
+        url = f"{ARM_ENDPOINT}/subscriptions/{subscription_id}/providers/Microsoft.Kusto/clusters?api-version=2023-08-15"
+        clusters.extend(_arm_list(url, token))
 
     if not clusters:
         print("No clusters returned. You may lack Azure RBAC visibility (Reader) to ADX resources.")
@@ -220,8 +310,10 @@ def discover_clusters() -> int:
     print("Discovered ADX clusters (ARM-visible):")
     for c in clusters:
         name = c.get("name")
-        resource_group = c.get("resourceGroup")
-        subscription_id = c.get("subscriptionId")
+        # /subscriptions/<sub>/resourceGroups/<rg>/providers/Microsoft.Kusto/clusters/<name>
+        id_parts = (c.get("id") or "").split("/")
+        resource_group = id_parts[4] if len(id_parts) > 4 else None
+        subscription_id = id_parts[2] if len(id_parts) > 2 else None
         location = c.get("location")
         uri = (c.get("properties") or {}).get("uri")
         query_uri = uri or (f"https://{name}.{location}.kusto.windows.net" if name and location else None)
@@ -242,7 +334,7 @@ def main():
     parser.add_argument(
         "--discover-clusters",
         action="store_true",
-        help="Discover ADX clusters via Azure CLI (requires Azure RBAC visibility)",
+        help="Discover ADX clusters via Azure Resource Manager (requires Azure RBAC visibility)",
     )
     parser.add_argument("--tables", metavar="DBNAME", help="List tables in the given database")
     parser.add_argument(
@@ -251,6 +343,10 @@ def main():
         metavar=("DBNAME", "TABLENAME"),
         help="Show sample rows from the given table",
     )
+    parser.add_argument("--schemas", metavar="DBNAME", help="Show column schemas for every table in the database")
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="Concurrent schema lookups for --schemas (default: 8)"
+    )
     parser.add_argument("--limit", type=int, default=2, help="Row limit for --sample (default: 2)")
     args = parser.parse_args()
 
@@ -272,6 +368,21 @@ def main():
     print(f"\nCluster URL: {cluster_url}\n")
 
     try:
+        if args.schemas:
+            schemas = get_table_schemas(cluster_url, args.schemas, concurrency=args.concurrency)
+            print("\n" + "=" * 80)
+            print(f"Table schemas in '{args.schemas}' ({len(schemas)} table(s)):")
+            print("=" * 80)
+            for tbl, columns in schemas.items():
+                print(f"\n{tbl}")
+                if isinstance(columns, BaseException):
+                    print(f"  ERROR: {columns}")
+                    continue
+                for name, col_type in columns:
+                    print(f"  - {name}: {col_type}")
+            print("\n" + "=" * 80)
+            return 0
+
         if args.sample:
             dbname, tablename = args.sample
             columns, rows = sample_rows(cluster_url, dbname, tablename, limit=args.limit)
@@ -11,6 +11,9 @@ This validates:
 
 import sys
 import os
+import io
+import json
+from unittest import mock
 
 # Add the parent directory to the path so we can import the module
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -51,6 +54,41 @@ def test_module_structure():
         return False
 
 
+def test_arm_list_follows_next_link():
+    """Cluster discovery's ARM helper returns every page of a collection, with the bearer token on each request."""
+    print("\nTesting ARM pagination...")
+    import list_databases
+
+    pages = {
+        "https://arm.test/clusters": {"value": [{"name": "a"}, {"name": "b"}], "nextLink": "https://arm.test/clusters?page=2"},
+        "https://arm.test/clusters?page=2": {"value": [{"name": "c"}]},
+    }
+    requested = []
+
+    def fake_urlopen(request, timeout=None):
+        requested.append((request.full_url, request.get_header("Authorization")))
+        return io.BytesIO(json.dumps(pages[request.full_url]).encode())
+
+    with mock.patch("urllib.request.urlopen", fake_urlopen):
+        items = list_databases._arm_list("https://arm.test/clusters", "tok")
+
+    assert [item["name"] for item in items] == ["a", "b", "c"], items
+    assert requested == [
+        ("https://arm.test/clusters", "Bearer tok"),
+        ("https://arm.test/clusters?page=2", "Bearer tok"),
+    ], requested
+    print("✓ _arm_list follows nextLink across pages")
+
+
+def _passes(test):
+    try:
+        test()
+        return True
+    except AssertionError as e:
+        print(f"✗ {test.__name__} failed: {e}")
+        return False
+
+
 def test_script_executable():
     """Test that the script is executable."""
     print("\nTesting script permissions...")
@@ -74,6 +112,7 @@ def main():
     results = []
     results.append(test_imports())
     results.append(test_module_structure())
+    results.append(_passes(test_arm_list_follows_next_link))
     results.append(test_script_executable())
     
     print("\n" + "=" * 80)
@@ -1,7 +1,12 @@
 import os
+import re
+import math
 import hashlib
 import base64
 import time
+import sqlite3
+import ipaddress
+import threading
 from flask import Flask, request, jsonify
 import mysql.connector
 from mysql.connector import pooling
@@ -22,6 +27,24 @@ DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_NAME = os.getenv('DB_NAME')
 ALLOWED_IPS = os.getenv('ALLOWED_IPS')
+# Idempotent saves: repeats of an Idempotency-Key (or, if enabled, of the same data) within the TTL
+# get the original x_id back instead of a new queue entry.
+DEDUP_TTL = int(os.getenv('DEDUP_TTL', '86400'))
+DEDUP_BY_CONTENT = os.getenv('DEDUP_BY_CONTENT', 'false').lower() in ('1', 'true', 'yes')
+DEDUP_PURGE_INTERVAL = 60  # seconds between purges of expired api_dedup rows, per worker
+ER_DUP_ENTRY = 1062
+ER_LOCK_DEADLOCK = 1213
+# Admission control for /api/save, shared by all uWSGI workers through a local SQLite file:
+# a token bucket per client and a high-water mark on the queue backlog, both answered with 429.
+ADMISSION_DB = os.getenv('ADMISSION_DB', '/tmp/fifo_admission.sqlite3')
+CLIENT_RATE = float(os.getenv('CLIENT_RATE', '10'))     # sustained saves per second per client
+CLIENT_BURST = float(os.getenv('CLIENT_BURST', '50'))   # bucket size
+BACKLOG_HIGH_WATER = int(os.getenv('BACKLOG_HIGH_WATER', '100000'))  # 0 disables the check
+BACKLOG_REFRESH = 1.0      # seconds a backlog reading is trusted before one worker re-reads it
+BACKLOG_RETRY_AFTER = 5    # Retry-After (seconds) while the backlog is over the high-water mark
+IDLE_BUCKET_TTL = 3600     # buckets of clients idle this long are dropped...
+BUCKET_PURGE_INTERVAL = 60  # ...checked at most this often (seconds) per worker
+TRUST_PROXY = os.getenv('TRUST_PROXY', 'false').lower() in ('1', 'true', 'yes')  # use nginx's X-Real-IP
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -37,26 +60,214 @@ connection_pool = pooling.MySQLConnectionPool(pool_name="apipool",
                                               pool_size=32,
                                               **dbconfig)
 
+def parse_allowed_ips(raw):
+    """ALLOWED_IPS as ip_network objects. Accepts addresses and CIDRs in any list-ish format
+    (e.g. "['127.0.0.1', '10.0.0.0/8']"); 'localhost' means 127.0.0.1 and ::1."""
+    networks = []
+    for token in re.findall(r'[0-9A-Za-z.:/]+', raw or ''):
+        if token == 'localhost':
+            networks += [ipaddress.ip_network('127.0.0.1'), ipaddress.ip_network('::1')]
+            continue
+        try:
+            networks.append(ipaddress.ip_network(token, strict=False))
+        except ValueError:
+            logging.warning(f"ALLOWED_IPS: ignoring {token!r}, not an address or CIDR")
+    return networks
+
+ALLOWED_NETWORKS = parse_allowed_ips(ALLOWED_IPS)
+
+def ip_allowed(addr):
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return any(ip in network for network in ALLOWED_NETWORKS)
+
+_admission = threading.local()
+_last_bucket_purge = 0.0
+
+def admission_db():
+    """This thread's connection to the admission state shared by all workers."""
+    conn = getattr(_admission, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(ADMISSION_DB, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets (client TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS backlog (id INTEGER PRIMARY KEY CHECK (id = 1), depth INTEGER NOT NULL, checked REAL NOT NULL)')
+        _admission.conn = conn
+    return conn
+
+def client_ip():
+    """The caller's address, for both the ALLOWED_IPS check and admission buckets."""
+    if TRUST_PROXY and request.headers.get('X-Real-IP'):
+        return request.headers['X-Real-IP']
+    return request.remote_addr
+
+def admit(client):
+    """Take a token for client. Returns (retry_after, reason, refresh_backlog).
+
+    retry_after is None when the request is admitted. refresh_backlog is True for the one request
+    (across all workers) that should re-read the backlog from MySQL; BEGIN IMMEDIATE serializes
+    workers so a bucket is never spent twice.
+    """
+    global _last_bucket_purge
+    now = time.time()
+    conn = admission_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if now - _last_bucket_purge >= BUCKET_PURGE_INTERVAL:
+            _last_bucket_purge = now
+            conn.execute('DELETE FROM buckets WHERE updated < ?', (now - IDLE_BUCKET_TTL,))
+        refresh = False
+        if BACKLOG_HIGH_WATER:
+            row = conn.execute('SELECT depth, checked FROM backlog WHERE id = 1').fetchone()
+            if row is None or now - row[1] >= BACKLOG_REFRESH:
+                # Claim the refresh so the other workers keep using the current reading meanwhile
+                conn.execute('INSERT INTO backlog (id, depth, checked) VALUES (1, ?, ?) '
+                             'ON CONFLICT (id) DO UPDATE SET checked = excluded.checked', (row[0] if row else 0, now))
+                refresh = True
+            if row is not None and row[0] >= BACKLOG_HIGH_WATER:
+                conn.execute('COMMIT')
+                return BACKLOG_RETRY_AFTER, f'Queue is full ({row[0]} waiting), try again later', refresh
+
+        row = conn.execute('SELECT tokens, updated FROM buckets WHERE client = ?', (client,)).fetchone()
+        tokens = CLIENT_BURST if row is None else min(CLIENT_BURST, row[0] + (now - row[1]) * CLIENT_RATE)
+        retry_after = None
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / CLIENT_RATE
+        conn.execute('INSERT INTO buckets (client, tokens, updated) VALUES (?, ?, ?) '
+                     'ON CONFLICT (client) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                     (client, tokens, now))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    if retry_after is not None:
+        return retry_after, f'Rate limit exceeded for {client}', refresh
+    return None, None, refresh
+
+def refresh_backlog():
+    """Re-read the queue depth from MySQL into the shared admission state."""
+    conn = cursor = None
+    try:
+        conn = connection_pool.get_connection()
+        cursor = conn.cursor()
+        # Count at most one row past the high-water mark: an exact depth below it, and a scan
+        # bounded by BACKLOG_HIGH_WATER however deep the queue gets.
+        cursor.execute('SELECT COUNT(*) FROM (SELECT 1 FROM api_calls LIMIT %s) AS waiting',
+                       (BACKLOG_HIGH_WATER + 1,))
+        depth = int(cursor.fetchone()[0])
+    except mysql.connector.Error as err:
+        logging.error(f"Backlog check failed: {err}")
+        return
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+    now = time.time()
+    db = admission_db()
+    db.execute('UPDATE backlog SET depth = ?, checked = ? WHERE id = 1', (depth, now))
+
+def admission_control(f):
+    """429 with Retry-After for clients over their rate, or everyone while the backlog is too deep."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        try:
+            retry_after, reason, refresh = admit(client_ip())
+            if refresh:
+                refresh_backlog()
+        except sqlite3.Error as err:
+            # Never turn a local state problem into an outage: admit and log
+            logging.error(f"Admission control unavailable: {err}")
+            retry_after = None
+        if retry_after is not None:
+            response = jsonify({'status': 'error', 'message': reason})
+            response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+            return response, 429
+        return f(*args, **kwargs)
+    return decorated_function
+
+_last_dedup_purge = 0.0
+
+def dedup_key(data):
+    """sha256 of the request's Idempotency-Key header, or of the data when DEDUP_BY_CONTENT is set."""
+    key = request.headers.get('Idempotency-Key')
+    if key:
+        return hashlib.sha256(f"key:{key}".encode('utf-8')).hexdigest()
+    if DEDUP_BY_CONTENT:
+        return hashlib.sha256(f"data:{data}".encode('utf-8')).hexdigest()
+    return None
+
+def find_duplicate(cursor, key, lock=False):
+    """(x_id, expired) of the save recorded under key, or None if there is none.
+
+    With lock, the read waits for a transaction that is still inserting the key to finish.
+    """
+    cursor.execute('SELECT x_id, created_at <= NOW() - INTERVAL %s SECOND FROM api_dedup WHERE dedup_key = %s'
+                   + (' LOCK IN SHARE MODE' if lock else ''), (DEDUP_TTL, key))
+    row = cursor.fetchone()
+    return (row[0], bool(row[1])) if row else None
+
+def purge_expired_dedup(conn):
+    """Drop expired api_dedup rows in a transaction of their own, at most once per DEDUP_PURGE_INTERVAL
+    in each worker. Runs after the save has committed, so its range locks never block other saves."""
+    global _last_dedup_purge
+    now = time.monotonic()
+    if now - _last_dedup_purge < DEDUP_PURGE_INTERVAL:
+        return
+    _last_dedup_purge = now
+    cursor = conn.cursor()
+    try:
+        cursor.execute('DELETE FROM api_dedup WHERE created_at < NOW() - INTERVAL %s SECOND LIMIT 10000', (DEDUP_TTL,))
+        conn.commit()
+    except mysql.connector.Error as err:
+        conn.rollback()
+        logging.error(f"Dedup purge failed: {err}")
+    finally:
+        cursor.close()
+
+def duplicate_response(x_id):
+    return jsonify({'status': 'success', 'message': f'Message already enqueued: x_id={x_id}', 'duplicate': True}), 200
+
 def ip_restricted(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if request.remote_addr not in ALLOWED_IPS:
+        if not ip_allowed(client_ip()):
             return jsonify({'status': 'error', 'message': 'Forbidden: Access is denied.'}), 403
         return f(*args, **kwargs)
     return decorated_function
 
 # Endpoint to save data to the database
 @app.route('/api/save', methods=['POST'])
+@admission_control
 def save_data():
     data = request.json.get('data')
     if not data:
         return jsonify({'status': 'error', 'message': 'No data provided'}), 400
 
+    key = dedup_key(data)
+
     try:
         conn = connection_pool.get_connection()
         cursor = conn.cursor()
+
+        if key:
+            # A retry of a save that already committed: answer without touching api_calls
+            found = find_duplicate(cursor, key)
+            if found and not found[1]:
+                conn.rollback()
+                return duplicate_response(found[0])
+            if found:
+                # Clear the expired row so the insert below can reuse the key. Only when it exists: a DELETE
+                # of a missing key takes a gap lock, and two saves holding the same gap deadlock on insert.
+                cursor.execute('DELETE FROM api_dedup WHERE dedup_key = %s AND created_at <= NOW() - INTERVAL %s SECOND',
+                               (key, DEDUP_TTL))
+
         cursor.execute('INSERT INTO api_calls (data) VALUES (%s)', (data,))
-        conn.commit()
 
         # Get the last inserted ID and the current timestamp
         cursor.execute('SELECT LAST_INSERT_ID(), NOW()')
@@ -71,6 +282,25 @@ def save_data():
         # Create the identifier
         identifier = f"{last_id}-{epoch_time}-{salt}"
 
+        if key:
+            # Same transaction as the queue entry: a concurrent retry with the same key blocks on the
+            # unique key until this commits, then fails with a duplicate entry and returns our x_id.
+            try:
+                cursor.execute('INSERT INTO api_dedup (dedup_key, x_id) VALUES (%s, %s)', (key, identifier))
+            except mysql.connector.Error as err:
+                if err.errno not in (ER_DUP_ENTRY, ER_LOCK_DEADLOCK):
+                    raise
+                # Drop our queue entry, then wait for the winner (still open after a deadlock) to commit
+                conn.rollback()
+                found = find_duplicate(cursor, key, lock=True)
+                conn.rollback()
+                if not found:
+                    raise
+                return duplicate_response(found[0])
+        conn.commit()
+        if key:
+            purge_expired_dedup(conn)
+
         return jsonify({'status': 'success', 'message': f'Message enqueued: x_id={identifier}'}), 202
     except mysql.connector.Error as err:
         logging.error(f"Error: {err}")
@@ -17,6 +17,15 @@ def init_db():
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # Idempotency-Key (or data) hash -> x_id of the save it created; rows expire after DEDUP_TTL
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS api_dedup (
+            dedup_key CHAR(64) PRIMARY KEY,
+            x_id VARCHAR(64) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX api_dedup_created_at (created_at)
+        )
+    ''')
     conn.commit()
     conn.close()
 
@@ -0,0 +1,139 @@
+"""
+Concurrency tests for the Idempotency-Key path of /api/save, run against a real MySQL server:
+
+    FIFO_TEST_DB_HOST=127.0.0.1 FIFO_TEST_DB_USER=api_gateway FIFO_TEST_DB_PASSWORD=... \
+    FIFO_TEST_DB_NAME=api_gateway_fifo python -m pytest -q test_api_fifo_server.py
+
+Tables are created with fifo_init.py if missing. The tests only touch the rows they create.
+Skipped when FIFO_TEST_DB_HOST is not set.
+"""
+
+import os
+import sys
+import hashlib
+import tempfile
+import threading
+import uuid
+
+import pytest
+
+if not os.getenv('FIFO_TEST_DB_HOST'):
+    pytest.skip("set FIFO_TEST_DB_HOST (and _USER, _PASSWORD, _NAME) to run against MySQL", allow_module_level=True)
+pytest.importorskip('flask')
+pytest.importorskip('dotenv')
+mysql = pytest.importorskip('mysql.connector')
+
+# Set before import: the server reads its settings (and builds its pool) at import time
+for name in ('HOST', 'USER', 'PASSWORD', 'NAME'):
+    os.environ[f'DB_{name}'] = os.getenv(f'FIFO_TEST_DB_{name}', '')
+os.environ.update(ADMISSION_DB=os.path.join(tempfile.mkdtemp(), 'admission.sqlite3'),
+                  CLIENT_RATE='1000000', CLIENT_BURST='1000000', BACKLOG_HIGH_WATER='0')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fifo_init  # noqa: E402
+import api_fifo_server  # noqa: E402
+
+saved_keys = []  # dedup keys the tests created, removed afterwards
+
+
+@pytest.fixture(scope='module')
+def db():
+    fifo_init.init_db()
+    conn = mysql.connector.connect(**api_fifo_server.dbconfig)
+    marker = f"test-{uuid.uuid4()}"
+    yield conn, marker
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM api_calls WHERE data LIKE %s', (f"{marker}%",))
+    cursor.executemany('DELETE FROM api_dedup WHERE dedup_key = %s', [(digest(key),) for key in saved_keys])
+    conn.commit()
+    conn.close()
+
+
+def digest(key):
+    return hashlib.sha256(f"key:{key}".encode('utf-8')).hexdigest()
+
+
+def save(key, data, results, barrier=None):
+    saved_keys.append(key)
+    client = api_fifo_server.app.test_client()
+    if barrier:
+        barrier.wait()
+    response = client.post('/api/save', json={'data': data}, headers={'Idempotency-Key': key})
+    results.append((response.status_code, response.get_json()))
+
+
+def x_id(body):
+    return body['message'].rsplit('x_id=', 1)[1]
+
+
+def queued(conn, data):
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM api_calls WHERE data = %s', (data,))
+    count = cursor.fetchone()[0]
+    conn.commit()  # end the read so the next one sees new rows
+    return count
+
+
+def run_concurrently(*calls):
+    results = []
+    barrier = threading.Barrier(len(calls))
+    threads = [threading.Thread(target=save, args=(key, data, results, barrier)) for key, data in calls]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    return results
+
+
+def test_concurrent_retries_share_one_x_id(db):
+    conn, marker = db
+    for i in range(20):
+        key, data = str(uuid.uuid4()), f"{marker}-retry-{i}"
+        results = run_concurrently((key, data), (key, data))
+        assert sorted(code for code, _ in results) == [200, 202], results
+        assert len({x_id(body) for _, body in results}) == 1, results
+        assert queued(conn, data) == 1
+
+
+def test_concurrent_new_keys_do_not_deadlock(db):
+    conn, marker = db
+    for i in range(5):
+        calls = [(str(uuid.uuid4()), f"{marker}-new-{i}-{j}") for j in range(8)]
+        results = run_concurrently(*calls)
+        assert [code for code, _ in results] == [202] * len(calls), results
+
+
+def test_retry_waits_for_open_save(db):
+    """A retry arriving while the first save's transaction is still open returns that save's x_id."""
+    conn, marker = db
+    key, data = str(uuid.uuid4()), f"{marker}-open"
+    first = mysql.connector.connect(**api_fifo_server.dbconfig)
+    first.cursor().execute('INSERT INTO api_dedup (dedup_key, x_id) VALUES (%s, %s)', (digest(key), 'first-x-id'))
+
+    results = []
+    retry = threading.Thread(target=save, args=(key, data, results))
+    retry.start()
+    retry.join(1)
+    assert retry.is_alive(), results  # blocked on the key the first save holds
+    first.commit()
+    first.close()
+    retry.join(30)
+
+    assert results == [(200, {'status': 'success', 'message': 'Message already enqueued: x_id=first-x-id',
+                               'duplicate': True})]
+    assert queued(conn, data) == 0
+
+
+def test_expired_key_is_reused(db):
+    conn, marker = db
+    key, data = str(uuid.uuid4()), f"{marker}-expired"
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO api_dedup (dedup_key, x_id, created_at) VALUES (%s, %s, NOW() - INTERVAL %s SECOND)',
+                   (digest(key), 'first-x-id', api_fifo_server.DEDUP_TTL + 60))
+    conn.commit()
+
+    results = []
+    save(key, data, results)
+    assert results[0][0] == 202, results
+    assert x_id(results[0][1]) != 'first-x-id'
+    assert queued(conn, data) == 1
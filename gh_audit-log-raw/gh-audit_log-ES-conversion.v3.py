@@ -1,18 +1,40 @@
 #!/usr/bin/env python3
 # Convert /var/log/github-audit.log into Elasticsearch format.
 # Import with: gzip --decompress --stdout audit_log-$index.gz | /usr/local/share/enterprise/ghe-es-load-json 'http://localhost:9200/audit_log-$index.gz'
+#
+# Or keep converting as the log grows (follows rotation and truncation like `tail -F`), appending
+# micro-batches to the per-month .gz files or bulk-indexing them straight into Elasticsearch:
+#   ./gh-audit_log-ES-conversion.v3.py /var/log/github-audit.log --follow -o ./output
+#   ./gh-audit_log-ES-conversion.v3.py /var/log/github-audit.log --follow --es-url http://localhost:9200
 
 import json
 import re
 import os
 import gzip
+import time
 import argparse
 import datetime
+import urllib.error
+import urllib.request
 from pathlib import Path
 import subprocess
 
+# --follow defaults
+BATCH_SIZE = 1000       # flush once this many documents are waiting...
+FLUSH_INTERVAL = 5.0    # ...or the oldest waiting document is this many seconds old
+POLL_INTERVAL = 0.5     # seconds between checks for new lines, rotation and truncation
+MAX_RETRY_DELAY = 60.0  # cap on the backoff between Elasticsearch retries
+
 def convert_log_line(line):
     """Convert a raw audit log line to Elasticsearch format"""
+    doc = build_es_doc(line)
+    if doc is None:
+        return None
+    # Convert to JSON with no extra spaces
+    return json.dumps(doc, separators=(',', ':')), doc["_index"]
+
+def build_es_doc(line):
+    """Convert a raw audit log line to an Elasticsearch document dict (_index, _id, _source)"""
     # Extract the JSON part from the line (everything after 'github_audit: ')
     match = re.search(r'github_audit: (.+)$', line)
     if not match:
@@ -82,16 +104,11 @@ def convert_log_line(line):
                 source["data"]["category_type"] = data["category_type"]
 
         # Create the Elasticsearch document structure exactly matching original format
-        es_doc = {
+        return {
             "_index": index_name,
             "_id": doc_id,
             "_source": source
         }
-
-        # Convert to JSON with no extra spaces
-        es_json = json.dumps(es_doc, separators=(',', ':'))
-
-        return es_json, index_name
     except json.JSONDecodeError:
         print(f"Error parsing JSON: {line}")
         return None
@@ -139,13 +156,176 @@ def process_log_file(input_file, output_dir):
                 for doc in docs:
                     out.write(doc + '\n')
 
+def follow_lines(path, poll_interval=POLL_INTERVAL, from_start=False):
+    """Yield lines appended to path, following rotation and truncation like `tail -F`.
+
+    Yields None after each idle poll so the caller can flush on time. Only complete lines are
+    yielded; a line the writer hasn't finished yet is held until its newline arrives.
+    """
+    f = None
+    pending = b''
+    while True:
+        if f is None:
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                # Not created yet, or between rotation and the new file being created. Either way
+                # everything it will hold is new, so read it from the beginning once it appears.
+                from_start = True
+                yield None
+                time.sleep(poll_interval)
+                continue
+            # Only a file that already existed when we started is skipped to its end
+            if not from_start:
+                f.seek(0, os.SEEK_END)
+            from_start = True
+
+        chunk = f.readline()
+        if chunk:
+            if chunk.endswith(b'\n'):
+                yield (pending + chunk).decode('utf-8', 'replace')
+                pending = b''
+            else:
+                pending += chunk
+            continue
+
+        # At EOF: find out whether the file was rotated, truncated, or is just idle
+        try:
+            current = os.stat(path)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(f.fileno())
+        if current is not None and (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev):
+            # Rotated: pick up anything written to the old file since the last read, then switch
+            for line in (pending + f.read()).splitlines(keepends=True):
+                yield line.decode('utf-8', 'replace')
+            print(f"{path} was rotated, reopening")
+            f.close()
+            f, pending = None, b''
+            continue
+        if current is not None and current.st_size < f.tell():
+            print(f"{path} was truncated, reading from the start")
+            f.seek(0)
+            pending = b''
+            continue
+        yield None
+        time.sleep(poll_interval)
+
+class GzipSink:
+    """Append each micro-batch to the per-month <index>.gz files as a new gzip member.
+
+    Concatenated members are still one valid gzip stream, so the files load the same way as the
+    batch output.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, docs):
+        by_index = {}
+        for doc in docs:
+            by_index.setdefault(doc["_index"], []).append(json.dumps(doc, separators=(',', ':')))
+        for index_name, lines in by_index.items():
+            with gzip.open(os.path.join(self.output_dir, f"{index_name}.gz"), 'at') as out:
+                out.write('\n'.join(lines) + '\n')
+        return ', '.join(f"{index_name}: {len(lines)}" for index_name, lines in by_index.items())
+
+class EsBulkSink:
+    """Index each micro-batch with one Elasticsearch _bulk request, retrying until it is accepted."""
+
+    def __init__(self, es_url):
+        self.url = es_url.rstrip('/') + '/_bulk'
+
+    def write(self, docs):
+        body = ''.join(
+            json.dumps({"index": {"_index": doc["_index"], "_id": doc["_id"]}}, separators=(',', ':')) + '\n'
+            + json.dumps(doc["_source"], separators=(',', ':')) + '\n'
+            for doc in docs
+        ).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, method='POST',
+                                         headers={'Content-Type': 'application/x-ndjson'})
+        delay = 1.0
+        while True:
+            try:
+                with urllib.request.urlopen(request, timeout=60) as resp:
+                    result = json.load(resp)
+                break
+            except urllib.error.HTTPError as e:
+                if e.code != 429 and e.code < 500:
+                    raise SystemExit(f"Elasticsearch rejected the bulk request ({e.code}): "
+                                     f"{e.read().decode('utf-8', 'replace')[:500]}")
+                reason = f"HTTP {e.code}"
+            except (urllib.error.URLError, OSError) as e:
+                reason = getattr(e, 'reason', e)
+            # Keep the batch (and stop reading the log) until Elasticsearch is back, so nothing is dropped
+            print(f"Elasticsearch unavailable ({reason}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+        failed = [item for item in result.get("items", []) if item.get("index", {}).get("error")]
+        if failed:
+            print(f"Warning: {len(failed)} documents failed to index, first error: {failed[0]['index']['error']}")
+        return f"{len(docs) - len(failed)} indexed"
+
+def follow_log_file(input_file, sink, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                    poll_interval=POLL_INTERVAL, from_start=False):
+    """Convert lines as they are appended to input_file, flushing micro-batches to sink.
+
+    A batch is flushed when it reaches batch_size documents or its oldest document has waited
+    flush_interval seconds, so memory is bounded by batch_size and latency by flush_interval.
+    """
+    batch = []
+    deadline = None
+
+    def flush():
+        summary = sink.write(batch)
+        print(f"Flushed {len(batch)} documents ({summary})")
+        batch.clear()
+
+    print(f"Following {input_file} (Ctrl-C to stop)")
+    try:
+        for line in follow_lines(input_file, poll_interval, from_start):
+            if line is not None:
+                doc = build_es_doc(line.strip())
+                if doc:
+                    if not batch:
+                        deadline = time.monotonic() + flush_interval
+                    batch.append(doc)
+            if batch and (len(batch) >= batch_size or time.monotonic() >= deadline):
+                flush()
+    except KeyboardInterrupt:
+        if batch:
+            flush()
+
 def main():
     parser = argparse.ArgumentParser(description='Convert GitHub audit logs to Elasticsearch format')
     parser.add_argument('input_file', help='Input audit log file')
     parser.add_argument('--output-dir', '-o', default='./output',
                         help='Output directory for converted logs (default: ./output)')
+    parser.add_argument('--follow', '-f', action='store_true',
+                        help='Keep running and convert new lines as they are appended, like tail -F')
+    parser.add_argument('--from-start', action='store_true',
+                        help='With --follow, convert the existing contents first instead of starting at the end '
+                             '(a file that does not exist yet is always read from its start)')
+    parser.add_argument('--es-url',
+                        help='With --follow, bulk-index into this Elasticsearch URL instead of writing .gz files')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f'With --follow, flush after this many documents (default: {BATCH_SIZE})')
+    parser.add_argument('--flush-interval', type=float, default=FLUSH_INTERVAL,
+                        help=f'With --follow, flush at least this often in seconds (default: {FLUSH_INTERVAL:g})')
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                        help=f'With --follow, seconds between checks for new lines (default: {POLL_INTERVAL:g})')
     args = parser.parse_args()
 
+    if args.follow:
+        sink = EsBulkSink(args.es_url) if args.es_url else GzipSink(args.output_dir)
+        follow_log_file(args.input_file, sink, max(1, args.batch_size), args.flush_interval,
+                        args.poll_interval, args.from_start)
+        return
+    if args.es_url:
+        parser.error('--es-url needs --follow')
+
     process_log_file(args.input_file, args.output_dir)
     print(f"Conversion complete. Files saved to {args.output_dir}")
 
@@ -1,27 +1,749 @@
-import redis
-import string
+#!/usr/bin/env python3
+"""Fill a Redis server until it hits maxmemory (OOM), a key count or a memory target.
+
+Writes go through pipelines (one MSET per batch for strings) from several threads, and
+values come from a pool of buffers generated once, so the client spends its time on the
+wire instead of building strings.
+
+    python redis_exhaustion.py                                   # 1 KB strings until OOM
+    python redis_exhaustion.py --threads 8 --pipeline 500 --target-memory 2gb
+    python redis_exhaustion.py --type stream --elements 16 --value-size 256 --keys 100000
+
+Benchmark mode samples INFO persistence / INFO memory while writing and times every pipeline
+round trip, to see what appendfsync and AOF rewrites cost under load (--pipeline 1 gives
+per-command latency):
+
+    python redis_exhaustion.py --benchmark aof.csv --duration 120 --pipeline 1
+
+Overwrite workloads rewrite a fixed keyspace, so the AOF grows while memory stays flat:
+
+    python redis_exhaustion.py --workload set-overwrite --keyspace 10000 --aof-target 5gb --rate 50000
+
+Cluster mode reads the slot map from a seed node and writes to every master (or the chosen ones)
+directly, with its own writer threads per node, then reports memory and AOF growth per node:
+
+    python redis_exhaustion.py --cluster --port 7000 --keys 300000
+    python redis_exhaustion.py --cluster --port 7000 --nodes 7001 --hash-tags --target-memory 1gb
+"""
+
+import argparse
+import binascii
+import csv
+import itertools
+import json
 import random
+import string
+import threading
+import time
+
+import redis
+
+VALUE_POOL = 256  # distinct pre-generated values, reused round-robin
+PROGRESS_INTERVAL = 2.0  # seconds between progress lines
+MEMORY_CHECK_INTERVAL = 0.2  # seconds between used_memory checks for --target-memory
+TYPES = ('string', 'hash', 'list', 'stream')
+WORKLOAD_KEYSPACE = 10000  # keys the overwrite workloads cycle through
+APPEND_SIZE = 64  # bytes per APPEND in the append-trim workload
+SAMPLE_INTERVAL = 1.0  # seconds between benchmark samples
+SPIKE_MS = 50.0  # round trips slower than this count as latency spikes
+CLUSTER_SLOTS = 16384
+
+# Server settings that shape AOF cost, recorded with every benchmark report.
+AOF_SETTINGS = (
+    'appendonly', 'appendfsync', 'no-appendfsync-on-rewrite', 'auto-aof-rewrite-percentage',
+    'auto-aof-rewrite-min-size', 'aof-use-rdb-preamble', 'maxmemory', 'maxmemory-policy',
+)
+
+
+def parse_size(text):
+    """'300mb' / '2G' / '512k' -> bytes (powers of 1024, like redis.conf)."""
+    units = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30}
+    value = text.strip().lower().removesuffix('b')
+    suffix = value[-1:] if value[-1:] in units else ''
+    try:
+        return int(float(value[:len(value) - len(suffix)]) * units[suffix])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size {text!r} (expected e.g. 300mb or 2g)")
 
-# Connect to the Redis server
-r = redis.Redis(host='localhost', port=6379, db=0)
 
 def random_string(length=1024):
     """Generate a random string of fixed length."""
     letters = string.ascii_letters + string.digits
-    return ''.join(random.choice(letters) for i in range(length))
+    return ''.join(random.choices(letters, k=length))
 
-def exhaust_memory():
-    i = 0
-    try:
+
+def make_values(size, count=VALUE_POOL):
+    """Pre-generated values, so the write loop never builds a string."""
+    return [random_string(size).encode() for _ in range(count)]
+
+
+def connect(args, max_connections=None, host=None, port=None):
+    pool = redis.ConnectionPool(
+        host=host or args.host, port=port or args.port, db=args.db, password=args.password,
+        max_connections=max_connections,
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+# One writer per --type. Each queues the commands for `keys` on `pipe`; `values` cycles
+# through the pre-generated pool.
+
+def write_strings(pipe, keys, values, elements):
+    pipe.mset(dict(zip(keys, values)))
+
+
+def write_hashes(pipe, keys, values, elements):
+    for key in keys:
+        pipe.hset(key, mapping={f"f{j}": next(values) for j in range(elements)})
+
+
+def write_lists(pipe, keys, values, elements):
+    for key in keys:
+        pipe.rpush(key, *(next(values) for _ in range(elements)))
+
+
+def write_streams(pipe, keys, values, elements):
+    for key in keys:
+        for _ in range(elements):
+            pipe.xadd(key, {'v': next(values)})
+
+
+def set_each(pipe, keys, values, *_):
+    """One SET per key, for cluster batches that span slots (nodes refuse a cross-slot MSET)."""
+    for key in keys:
+        pipe.set(key, next(values))
+
+
+WRITERS = {'string': write_strings, 'hash': write_hashes, 'list': write_lists, 'stream': write_streams}
+
+
+# Overwrite workloads: one operation per key in `keys` (drawn from the fixed keyspace, so
+# repeats are expected). Each keeps the per-key size bounded, while every command still
+# lands in the AOF.
+
+def overwrite_strings(pipe, keys, values, args, rng):
+    pipe.mset(dict(zip(keys, values)))
+
+
+def increment(pipe, keys, values, args, rng):
+    for key in keys:
+        pipe.incr(key)
+
+
+def append_trim(pipe, keys, values, args, rng):
+    """APPEND small chunks; now and then SET the key back to one chunk, so lengths average --value-size."""
+    reset = args.append_size / max(args.value_size, args.append_size)
+    for key in keys:
+        chunk = next(values)[:args.append_size]
+        if rng.random() < reset:
+            pipe.set(key, chunk)
+        else:
+            pipe.append(key, chunk)
+
+
+def hash_churn(pipe, keys, values, args, rng):
+    """HSET or HDEL a random field out of 2 x --elements, so hashes hover around --elements fields."""
+    for key in keys:
+        field = f"f{rng.randrange(args.elements * 2)}"
+        if rng.random() < 0.5:
+            pipe.hdel(key, field)
+        else:
+            pipe.hset(key, field, next(values))
+
+
+def list_push_pop(pipe, keys, values, args, rng):
+    """RPUSH a value and drop the oldest past --elements (LTRIM), like a capped queue."""
+    for key in keys:
+        pipe.rpush(key, next(values))
+        pipe.ltrim(key, -args.elements, -1)
+
+
+WORKLOADS = {
+    'set-overwrite': overwrite_strings,
+    'incr': increment,
+    'append-trim': append_trim,
+    'hset-churn': hash_churn,
+    'list-pushpop': list_push_pop,
+}
+
+
+class TokenBucket:
+    """Shared rate limit across writer threads: `rate` operations per second, bursting up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n):
         while True:
-            key = f"key:{i}"
-            value = random_string()
-            r.set(key, value)
-            i += 1
-            if i % 1000 == 0:
-                print(f"Inserted {i} keys")
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class FillState:
+    """Shared between the writer threads: next batch number, keys written, stop flag and reason.
+
+    With `record_latency`, writers also append the duration of every pipeline round trip,
+    and the benchmark sampler collects them once per interval.
+    """
+
+    def __init__(self, record_latency=False):
+        self.batches = itertools.count()
+        self.lock = threading.Lock()
+        self.keys = 0
+        self.stop = threading.Event()
+        self.reason = None
+        self.latencies = [] if record_latency else None
+
+    def add(self, keys, latency=None):
+        with self.lock:
+            self.keys += keys
+            if self.latencies is not None:
+                self.latencies.append(latency)
+
+    def take_latencies(self):
+        with self.lock:
+            taken, self.latencies = self.latencies, []
+        return taken
+
+    def finish(self, reason):
+        with self.lock:
+            if self.reason is None:
+                self.reason = reason
+        self.stop.set()
+
+
+def key_slot(key):
+    """Cluster hash slot of key (bytes): CRC16/XMODEM of the key, or of its {hash tag}, mod 16384."""
+    start = key.find(b'{')
+    if start != -1:
+        end = key.find(b'}', start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    return binascii.crc_hqx(key, 0) % CLUSTER_SLOTS
+
+
+def slot_tags(slots):
+    """A short hash tag for each of `slots`, in order: keys containing {tag} hash to that slot."""
+    wanted, tags = set(slots), {}
+    for n in itertools.count():
+        if not wanted:
+            break
+        tag = str(n)
+        slot = binascii.crc_hqx(tag.encode(), 0) % CLUSTER_SLOTS
+        if slot in wanted:
+            tags[slot] = tag
+            wanted.discard(slot)
+    return [tags[slot] for slot in slots]
+
+
+class ClusterNode:
+    """A master from CLUSTER SLOTS: the slots it owns, its own connections, and the keys handed to its writers.
+
+    `state` is a per-node FillState, so an OOM, a full --target-memory or a dropped connection stops this
+    node's writers while the other nodes keep filling.
+    """
+
+    def __init__(self, host, port, node_id):
+        self.host, self.port, self.id = host, port, node_id
+        self.name = f"{host}:{port}"
+        self.owned = bytearray(CLUSTER_SLOTS)  # 1 for each slot this node serves
+        self.client = None
+        self.state = FillState()
+        self.lock = threading.Lock()
+        self.quota = None  # this node's share of --keys
+        self.assigned = 0  # keys handed out so far
+        self.candidate = 0  # next key number to try, without hash tags
+        self.tags = []  # one hash tag per owned slot, with --hash-tags
+        self.keyspace = []  # the overwrite workloads' keys that live on this node
+        self.info_before = self.info = None
+
+    @property
+    def slots(self):
+        return [slot for slot in range(CLUSTER_SLOTS) if self.owned[slot]]
+
+    def fill_keys(self, args):
+        """The next batch of new keys for this node, or [] once its share of --keys is handed out.
+
+        With --hash-tags the whole batch shares the tag of one owned slot (cycling through them),
+        otherwise key numbers are tried in order and kept when they hash to this node. Every node
+        tries the same numbers, so the nodes end up with disjoint, plain `<prefix><n>` keys.
+        """
+        with self.lock:
+            count = args.pipeline if self.quota is None else min(args.pipeline, self.quota - self.assigned)
+            if count <= 0:
+                return []
+            if args.hash_tags:
+                tag = self.tags[(self.assigned // args.pipeline) % len(self.tags)]
+                keys = [f"{{{tag}}}{args.prefix}{i}" for i in range(self.assigned, self.assigned + count)]
+            else:
+                keys = []
+                while len(keys) < count:
+                    key = f"{args.prefix}{self.candidate}"
+                    self.candidate += 1
+                    if self.owned[key_slot(key.encode())]:
+                        keys.append(key)
+            self.assigned += count
+            return keys
+
+
+def fill_worker(client, args, values, state, limiter=None, node=None):
+    """Write batches until `state` stops. In cluster mode `node` supplies the keys, and errors stop only that node."""
+    pool = itertools.cycle(values)
+    rng = random.Random()
+    if args.workload == 'fill':
+        write, extra = WRITERS[args.type], (args.elements,)
+    else:
+        write, extra = WORKLOADS[args.workload], (args, rng)
+    if node and write in (write_strings, overwrite_strings) and not (args.hash_tags and args.workload == 'fill'):
+        write = set_each
+    stopper = node.state if node else state
+    while not stopper.stop.is_set() and not state.stop.is_set():
+        if node:
+            keys = node.fill_keys(args) if args.workload == 'fill' else rng.choices(node.keyspace, k=args.pipeline)
+            if not keys:
+                node.state.finish(f"wrote {node.assigned} keys")
+                return
+        elif args.workload == 'fill':
+            start = next(state.batches) * args.pipeline
+            stop = start + args.pipeline if args.keys is None else min(start + args.pipeline, args.keys)
+            if start >= stop:
+                state.finish(f"wrote {args.keys} keys")
+                return
+            keys = [f"{args.prefix}{i}" for i in range(start, stop)]
+        else:
+            keys = [f"{args.prefix}{rng.randrange(args.keyspace)}" for _ in range(args.pipeline)]
+        if limiter:
+            limiter.acquire(len(keys))
+            if state.stop.is_set():
+                return
+        pipe = client.pipeline(transaction=False)
+        write(pipe, keys, pool, *extra)
+        started = time.perf_counter()
+        try:
+            pipe.execute()
+        except redis.exceptions.ResponseError as e:
+            # OOM command not allowed when used memory > 'maxmemory' (or MOVED if a slot migrated mid-run)
+            stopper.finish(f"server refused writes: {e}")
+            return
+        except redis.exceptions.ConnectionError as e:
+            stopper.finish(f"Redis crashed or refused connection: {e}")
+            return
+        state.add(len(keys), time.perf_counter() - started)
+        if node:
+            node.state.add(len(keys))
+
+
+def report(client, args, state, started):
+    """Print progress and stop the writers at --target-memory, --aof-target or --duration."""
+    unit = 'keys' if args.workload == 'fill' else 'ops'
+    last_keys, last_time = 0, started
+    while not state.stop.wait(MEMORY_CHECK_INTERVAL):
+        try:
+            info = client.info()
+        except redis.exceptions.ConnectionError as e:
+            state.finish(f"Redis crashed or refused connection: {e}")
+            return
+        now = time.time()
+        if args.target_memory and info['used_memory'] >= args.target_memory:
+            state.finish(f"used_memory reached {info['used_memory_human']}")
+        if args.aof_target and info.get('aof_current_size', 0) >= args.aof_target:
+            state.finish(f"AOF reached {info['aof_current_size'] / 1e6:.0f} MB")
+        if args.duration and now - started >= args.duration:
+            state.finish(f"ran for {args.duration:g}s")
+        if now - last_time < PROGRESS_INTERVAL:
+            continue
+        keys = state.keys
+        aof = ""
+        if info.get('aof_enabled'):
+            aof = f", aof {info.get('aof_current_size', 0) / 1e6:.0f} MB"
+        print(f"Wrote {keys} {unit} ({(keys - last_keys) / (now - last_time):.0f} {unit}/s), "
+              f"used_memory {info['used_memory_human']}{aof}")
+        last_keys, last_time = keys, now
+
+
+def report_cluster(nodes, args, state, started):
+    """report() for cluster mode: --target-memory and --aof-target apply to each node on its own."""
+    unit = 'keys' if args.workload == 'fill' else 'ops'
+    last_keys, last_time = 0, started
+    while not state.stop.wait(MEMORY_CHECK_INTERVAL):
+        for node in nodes:
+            if node.state.stop.is_set():
+                continue
+            try:
+                node.info = info = node.client.info()
+            except redis.exceptions.ConnectionError as e:
+                node.state.finish(f"Redis crashed or refused connection: {e}")
+                continue
+            if args.target_memory and info['used_memory'] >= args.target_memory:
+                node.state.finish(f"used_memory reached {info['used_memory_human']}")
+            if args.aof_target and info.get('aof_current_size', 0) >= args.aof_target:
+                node.state.finish(f"AOF reached {info['aof_current_size'] / 1e6:.0f} MB")
+        now = time.time()
+        if args.duration and now - started >= args.duration:
+            state.finish(f"ran for {args.duration:g}s")
+        if now - last_time < PROGRESS_INTERVAL:
+            continue
+        keys = state.keys
+        per_node = []
+        for node in nodes:
+            aof = f"/aof {node.info.get('aof_current_size', 0) / 1e6:.0f} MB" if node.info.get('aof_enabled') else ""
+            per_node.append(f"{node.name} {node.info['used_memory_human']}{aof}")
+        print(f"Wrote {keys} {unit} ({(keys - last_keys) / (now - last_time):.0f} {unit}/s), "
+              f"used_memory {', '.join(per_node)}")
+        last_keys, last_time = keys, now
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def latency_summary(latencies):
+    """p50/p99/p99.9/max in ms of pipeline round trips, and the number over SPIKE_MS."""
+    ms = sorted(x * 1000 for x in latencies)
+    return {
+        'round_trips': len(ms),
+        'p50_ms': round(percentile(ms, 0.50), 3),
+        'p99_ms': round(percentile(ms, 0.99), 3),
+        'p999_ms': round(percentile(ms, 0.999), 3),
+        'max_ms': round(ms[-1], 3) if ms else 0.0,
+        'spikes': sum(1 for x in ms if x > SPIKE_MS),
+    }
+
+
+def aof_settings(client):
+    settings = {}
+    for name in AOF_SETTINGS:
+        try:
+            settings.update({k: str(v) for k, v in client.config_get(name).items()})
+        except redis.exceptions.ResponseError:
+            pass  # CONFIG disabled/renamed (managed Redis)
+    return settings
+
+
+def sample(client, args, state, started, samples, all_latencies):
+    """Benchmark sampler: one row per interval of INFO persistence/memory plus round-trip latency."""
+    last_keys, last_time = 0, started
+    while True:
+        stopped = state.stop.wait(args.sample_interval)
+        try:
+            info = client.info()  # default sections: memory, persistence and stats in one round trip
+        except redis.exceptions.ConnectionError:
+            return
+        now, keys = time.time(), state.keys
+        latencies = state.take_latencies()
+        rewriting = bool(info.get('aof_rewrite_in_progress'))
+        all_latencies.append((rewriting, latencies))
+        samples.append({
+            't': round(now - started, 3),
+            'keys': keys,
+            'keys_per_sec': round((keys - last_keys) / max(now - last_time, 1e-9)),
+            **latency_summary(latencies),
+            'used_memory': info.get('used_memory'),
+            'used_memory_rss': info.get('used_memory_rss'),
+            'aof_current_size': info.get('aof_current_size', 0),
+            'aof_base_size': info.get('aof_base_size', 0),
+            'aof_rewrite_in_progress': int(rewriting),
+            'aof_rewrite_scheduled': info.get('aof_rewrite_scheduled', 0),
+            'aof_delayed_fsync': info.get('aof_delayed_fsync', 0),
+            'aof_last_cow_size': info.get('aof_last_cow_size', 0),
+            'latest_fork_usec': info.get('latest_fork_usec', 0),
+        })
+        last_keys, last_time = keys, now
+        if stopped:
+            return
+
+
+def write_report(path, settings, samples, summary):
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump({'settings': settings, 'summary': summary, 'samples': samples}, f, indent=2)
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(samples[0]) if samples else ['t'])
+        writer.writeheader()
+        writer.writerows(samples)
+
+
+def benchmark_summary(samples, all_latencies, pipeline):
+    """Overall round-trip latency, split by whether an AOF rewrite was running, plus rewrite/fork stats."""
+    during = [x for rewriting, batch in all_latencies if rewriting for x in batch]
+    outside = [x for rewriting, batch in all_latencies if not rewriting for x in batch]
+    starts = sum(1 for a, b in zip([{}] + samples, samples)
+                 if b['aof_rewrite_in_progress'] and not a.get('aof_rewrite_in_progress'))
+    return {
+        'keys_per_round_trip': pipeline,  # at most: the last batch before --keys may be short
+        'all': latency_summary(during + outside),
+        'during_rewrite': latency_summary(during),
+        'outside_rewrite': latency_summary(outside),
+        'rewrites_seen': starts,
+        'max_fork_usec': max((s['latest_fork_usec'] for s in samples), default=0),
+        # Rewrites shrink the file, so start/end alone understate how much was written.
+        'aof_start_bytes': samples[0]['aof_current_size'] if samples else 0,
+        'aof_end_bytes': samples[-1]['aof_current_size'] if samples else 0,
+        'aof_peak_bytes': max((s['aof_current_size'] for s in samples), default=0),
+    }
+
+
+def print_summary(settings, summary):
+    print("Benchmark ({}):".format(", ".join(f"{k}={v}" for k, v in settings.items()) or "settings unavailable"))
+    print(f"  Latency per pipeline round trip of up to {summary['keys_per_round_trip']} keys:")
+    for label in ('all', 'outside_rewrite', 'during_rewrite'):
+        s = summary[label]
+        print(f"  {label:>15}: {s['round_trips']} round trips, p50 {s['p50_ms']} ms, p99 {s['p99_ms']} ms, "
+              f"p99.9 {s['p999_ms']} ms, max {s['max_ms']} ms, {s['spikes']} over {SPIKE_MS:g} ms")
+    print(f"  AOF {summary['aof_start_bytes'] / 1e6:.1f} -> {summary['aof_end_bytes'] / 1e6:.1f} MB "
+          f"(peak {summary['aof_peak_bytes'] / 1e6:.1f} MB), {summary['rewrites_seen']} rewrite(s) started, "
+          f"max fork {summary['max_fork_usec'] / 1000:.1f} ms")
+
+
+def exhaust_memory(args):
+    # One connection per writer, plus the reporter and the --benchmark sampler, which share the pool
+    client = connect(args, max_connections=args.threads + 2)
+    try:
+        client.ping()
+    except redis.exceptions.ConnectionError as e:
+        raise SystemExit(f"Could not connect to Redis at {args.host}:{args.port}: {e}")
+    if args.aof_target and not client.info('persistence').get('aof_enabled'):
+        raise SystemExit("--aof-target needs AOF enabled: redis-cli CONFIG SET appendonly yes")
+
+    values = make_values(args.value_size)
+    limiter = TokenBucket(args.rate, max(args.rate / 10, args.pipeline)) if args.rate else None
+    state = FillState(record_latency=bool(args.benchmark))
+    settings = aof_settings(client) if args.benchmark else {}
+    samples, all_latencies = [], []
+    started = time.time()
+    threads = [
+        threading.Thread(target=fill_worker, args=(client, args, values, state, limiter), daemon=True)
+        for _ in range(args.threads)
+    ]
+    for t in threads:
+        t.start()
+    reporter = threading.Thread(target=report, args=(client, args, state, started), daemon=True)
+    reporter.start()
+    sampler = None
+    if args.benchmark:
+        sampler = threading.Thread(target=sample, args=(client, args, state, started, samples, all_latencies))
+        sampler.start()
+    try:
+        for t in threads:
+            t.join()
+    except KeyboardInterrupt:
+        state.finish("interrupted")
+        for t in threads:
+            t.join()
+    state.finish("done")
+    if sampler:
+        sampler.join()
+
+    elapsed = time.time() - started
+    print(f"Stopped: {state.reason}")
+    rate = state.keys / max(elapsed, 1e-9)
+    if args.workload == 'fill':
+        print(f"Inserted {state.keys} {args.type} keys in {elapsed:.1f}s ({rate:.0f} keys/s)")
+    else:
+        print(f"Ran {state.keys} {args.workload} ops on {args.keyspace} keys in {elapsed:.1f}s ({rate:.0f} ops/s)")
+    try:
+        info = client.info()
+        aof = f", aof {info['aof_current_size'] / 1e6:.0f} MB" if info.get('aof_enabled') else ""
+        print(f"used_memory {info['used_memory_human']}{aof}")
+    except redis.exceptions.ConnectionError:
+        pass
+    if args.benchmark:
+        summary = benchmark_summary(samples, all_latencies, args.pipeline)
+        print_summary(settings, summary)
+        write_report(args.benchmark, settings, samples, summary)
+        print(f"Wrote {len(samples)} samples to {args.benchmark}")
+
+
+def cluster_nodes(args):
+    """The masters in CLUSTER SLOTS of the seed node --host/--port, with the slots each one serves."""
+    seed = connect(args)
+    try:
+        ranges = seed.execute_command('CLUSTER', 'SLOTS')
     except redis.exceptions.ConnectionError as e:
-        print(f"Redis crashed or refused connection: {e}")
+        raise SystemExit(f"Could not connect to Redis at {args.host}:{args.port}: {e}")
+    except redis.exceptions.ResponseError as e:
+        raise SystemExit(f"{args.host}:{args.port} is not a cluster node ({e}); run without --cluster")
+    finally:
+        seed.close()
+    nodes = {}
+    for start, end, master, *_replicas in ranges:
+        host = master[0].decode() if isinstance(master[0], bytes) else master[0]
+        if host in ('', '?'):  # the node doesn't know its own address; it is the seed's
+            host = args.host
+        node_id = master[2].decode() if len(master) > 2 else f"{host}:{master[1]}"
+        node = nodes.setdefault(node_id, ClusterNode(host, int(master[1]), node_id))
+        node.owned[start:end + 1] = b'\x01' * (end - start + 1)
+    if not nodes:
+        raise SystemExit(f"{args.host}:{args.port} reports no slots assigned; create the cluster first")
+    return sorted(nodes.values(), key=lambda n: (n.host, n.port))
+
+
+def select_nodes(nodes, spec):
+    """--nodes: comma-separated host:port, port or node ID prefix, each matching exactly one master."""
+    if not spec:
+        return nodes
+    chosen = []
+    for item in spec.split(','):
+        item = item.strip()
+        matches = [n for n in nodes if item in (n.name, str(n.port)) or n.id.startswith(item)]
+        if len(matches) != 1:
+            known = ', '.join(f"{n.name} ({n.id[:8]})" for n in nodes)
+            raise SystemExit(f"--nodes {item!r} matches {len(matches)} masters; the masters are {known}")
+        if matches[0] not in chosen:
+            chosen.append(matches[0])
+    return chosen
+
+
+def exhaust_cluster(args):
+    nodes = cluster_nodes(args)
+    targets = select_nodes(nodes, args.nodes)
+    for node in targets:
+        node.client = connect(args, args.threads + 1, node.host, node.port)  # the node's writers and the reporter
+        try:
+            node.info_before = node.info = node.client.info()
+        except redis.exceptions.ConnectionError as e:
+            raise SystemExit(f"Could not connect to {node.name} from the slot map: {e}")
+        if args.aof_target and not node.info.get('aof_enabled'):
+            raise SystemExit(f"--aof-target needs AOF enabled on every node: redis-cli -p {node.port} "
+                             f"CONFIG SET appendonly yes")
+
+    # Spread the work evenly over the chosen nodes, whatever their share of the slots.
+    for i, node in enumerate(targets):
+        if args.keys is not None:
+            node.quota = args.keys // len(targets) + (i < args.keys % len(targets))
+        if args.hash_tags:
+            node.tags = slot_tags(node.slots)
+        if args.workload == 'fill':
+            continue
+        if args.hash_tags:
+            share = max(1, args.keyspace // len(targets))
+            node.keyspace = [f"{{{node.tags[r % len(node.tags)]}}}{args.prefix}{r}" for r in range(share)]
+        else:
+            keys = (f"{args.prefix}{r}" for r in range(args.keyspace))
+            node.keyspace = [key for key in keys if node.owned[key_slot(key.encode())]]
+            if not node.keyspace:
+                node.state.finish("none of the --keyspace keys hash to it")
+    print(f"Cluster of {len(nodes)} masters, writing to " + ", ".join(
+        f"{node.name} ({len(node.slots)} slots)" for node in targets))
+
+    values = make_values(args.value_size)
+    limiter = TokenBucket(args.rate, max(args.rate / 10, args.pipeline)) if args.rate else None
+    state = FillState()
+    started = time.time()
+    threads = [
+        threading.Thread(target=fill_worker, args=(node.client, args, values, state, limiter, node), daemon=True)
+        for node in targets for _ in range(args.threads)
+    ]
+    for t in threads:
+        t.start()
+    reporter = threading.Thread(target=report_cluster, args=(targets, args, state, started), daemon=True)
+    reporter.start()
+    try:
+        for t in threads:
+            t.join()
+    except KeyboardInterrupt:
+        state.finish("interrupted")
+        for t in threads:
+            t.join()
+    state.finish("every node stopped")
+
+    elapsed = time.time() - started
+    print(f"Stopped: {state.reason}")
+    rate = state.keys / max(elapsed, 1e-9)
+    if args.workload == 'fill':
+        print(f"Inserted {state.keys} {args.type} keys in {elapsed:.1f}s ({rate:.0f} keys/s)")
+    else:
+        print(f"Ran {state.keys} {args.workload} ops on {args.keyspace} keys in {elapsed:.1f}s ({rate:.0f} ops/s)")
+    for node in targets:
+        try:
+            node.info = node.client.info()
+        except redis.exceptions.ConnectionError:
+            pass
+        before, after = node.info_before, node.info
+        line = (f"  {node.name}: {node.state.keys} {'keys' if args.workload == 'fill' else 'ops'}, "
+                f"used_memory {before['used_memory'] / 1e6:.1f} -> {after['used_memory'] / 1e6:.1f} MB")
+        if after.get('aof_enabled'):
+            line += (f", aof {before.get('aof_current_size', 0) / 1e6:.1f} -> "
+                     f"{after.get('aof_current_size', 0) / 1e6:.1f} MB")
+        print(f"{line} ({node.state.reason or state.reason})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill Redis memory (and its AOF) as fast as possible")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--db', type=int, default=0)
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--type', choices=TYPES, default='string', help="Value type to write (default: string)")
+    parser.add_argument('--value-size', type=int, default=1024,
+                        help="Bytes per value: string value, hash field, list element or stream entry (default: 1024)")
+    parser.add_argument('--elements', type=int, default=8,
+                        help="Fields / elements / entries per hash, list or stream key (default: 8)")
+    parser.add_argument('--keys', type=int, default=None, help="Stop after this many keys (default: until OOM)")
+    parser.add_argument('--target-memory', type=parse_size, default=None,
+                        help="Stop once used_memory reaches this, e.g. 300mb (default: until OOM)")
+    parser.add_argument('--threads', type=int, default=4, help="Writer threads, per node with --cluster (default: 4)")
+    parser.add_argument('--pipeline', type=int, default=100,
+                        help="Keys per pipeline round trip; strings go as one MSET (default: 100)")
+    parser.add_argument('--prefix', default=None,
+                        help="Key prefix (default: key: for fill, <workload>: for overwrite workloads)")
+    parser.add_argument('--workload', choices=('fill',) + tuple(WORKLOADS), default='fill',
+                        help="fill: create new keys of --type; others rewrite a fixed --keyspace (default: fill)")
+    parser.add_argument('--keyspace', type=int, default=WORKLOAD_KEYSPACE,
+                        help=f"Keys the overwrite workloads cycle through (default: {WORKLOAD_KEYSPACE})")
+    parser.add_argument('--append-size', type=int, default=APPEND_SIZE,
+                        help=f"Bytes per APPEND for append-trim (default: {APPEND_SIZE})")
+    parser.add_argument('--rate', type=float, default=None, help="Limit to this many operations per second")
+    parser.add_argument('--duration', type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument('--aof-target', type=parse_size, default=None,
+                        help="Stop once aof_current_size reaches this, e.g. 5gb")
+    parser.add_argument('--benchmark', nargs='?', const='aof_benchmark.csv', default=None, metavar='REPORT',
+                        help="Sample INFO persistence/memory and pipeline round-trip latency into REPORT "
+                             "(.csv or .json, default: aof_benchmark.csv)")
+    parser.add_argument('--sample-interval', type=float, default=SAMPLE_INTERVAL,
+                        help=f"Seconds between benchmark samples (default: {SAMPLE_INTERVAL:g})")
+    parser.add_argument('--cluster', action='store_true',
+                        help="--host/--port is a Redis Cluster node: read its slot map and write to every master")
+    parser.add_argument('--nodes', default=None,
+                        help="With --cluster, only write to these masters: comma-separated host:port, port or "
+                             "node ID prefix (default: all, evenly)")
+    parser.add_argument('--hash-tags', action='store_true',
+                        help="With --cluster, pin each batch of keys to one of the node's slots with a {hash tag}, "
+                             "so strings go as one MSET")
+    args = parser.parse_args()
+    if args.cluster:
+        if args.db != 0:
+            parser.error("Redis Cluster only has --db 0")
+        if args.benchmark:
+            parser.error("--benchmark samples a single server; point it at one node without --cluster")
+    elif args.nodes or args.hash_tags:
+        parser.error("--nodes and --hash-tags need --cluster")
+    if args.workload != 'fill' and args.keys is not None:
+        parser.error("--keys only applies to --workload fill; use --duration or --aof-target")
+    if args.prefix is None:
+        args.prefix = 'key:' if args.workload == 'fill' else f"{args.workload}:"
+    tag_start = args.prefix.find('{')
+    if args.cluster and tag_start != -1 and args.prefix.find('}', tag_start + 2) != -1:
+        parser.error("with --cluster, --prefix must not contain a {hash tag}; use --hash-tags")
+    if args.cluster:
+        exhaust_cluster(args)
+    else:
+        exhaust_memory(args)
+
 
 if __name__ == "__main__":
-    exhaust_memory()
+    main()
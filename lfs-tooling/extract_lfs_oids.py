@@ -1,32 +1,394 @@
 # Identify LFS OIDs on GHES for repo.
 # Usage:
 # $ ghe-repo <ORG>/<REPO> -c 'git rev-list --objects --all | awk '"'"'{print $1}'"'"' | sort -u | git cat-file --batch | python3 /tmp/extract_lfs_oids.py' > /tmp/all_lfs_oids.txt
+#
+# Or let the script drive git itself. Only blobs small enough to be pointers are read:
+# $ ghe-repo <ORG>/<REPO> -c 'python3 /tmp/extract_lfs_oids.py --repo .' > /tmp/all_lfs_oids.txt
+#
+# Nightly audits can rescan only what changed: the ref tips and OIDs found are kept in <state> and
+# <state>.oids, and the next run walks `rev-list <new tips> --not <old tips>` and merges:
+# $ ghe-repo <ORG>/<REPO> -c 'python3 /tmp/extract_lfs_oids.py --repo . --state /tmp/lfs_state.json' > /tmp/all_lfs_oids.txt
+#
+# Compare referenced OIDs with an LFS storage directory (<dir>/xx/yy/<oid>) and report orphaned and missing
+# objects. Both sides are streamed in sorted order, so a saved OID list keeps memory flat. Save the list
+# with --sizes so missing objects can be totalled in bytes:
+# $ ghe-repo <ORG>/<REPO> -c 'python3 /tmp/extract_lfs_oids.py --repo . --sizes' > /tmp/all_lfs_oids.txt
+# $ python3 extract_lfs_oids.py --storage /data/user/storage/lfs --referenced /tmp/all_lfs_oids.txt > /tmp/lfs_diff.txt
+
+import argparse, binascii, heapq, json, os, re, subprocess, sys, tempfile, threading, time
 
-import sys, re
 ver = b"version https://git-lfs.github.com/spec/v1"
 oid_re = re.compile(br"^oid sha256:([0-9a-f]{64})$")
-oids = set()
-s = sys.stdin.buffer
-
-while True:
-    hdr = s.readline()
-    if not hdr:
-        break
-    parts = hdr.split()
-    if len(parts) < 3:
-        continue
-    typ = parts[1]
-    size = int(parts[2])
-    data = s.read(size)
-    s.read(1)
-
-    if typ != b"blob" or size > 512 or not data.startswith(ver):
-        continue
-
-    for line in data.splitlines():
-        m = oid_re.match(line)
-        if m:
-            oids.add(m.group(1).decode("ascii"))
-
-for oid in sorted(oids):
-    print(oid)
+MAX_POINTER_SIZE = 512
+# version line + "oid sha256:<64 hex>" line + "size N" line
+MIN_POINTER_SIZE = len(ver) + 1 + len(b"oid sha256:") + 64 + 1 + len(b"size 0\n")
+SIZE_LINE = b"\nsize "
+HEX = b"0123456789abcdef"
+RECORD = 40  # OidSet entry: 32-byte sha256 digest + 8-byte big-endian LFS object size
+MAX_OBJECT_SIZE = 1 << 64  # sizes must fit the record's 8 bytes
+SPILL_MB = 16  # OidSet buffer size before a sorted run is spilled to a temp file
+
+
+class OidSet:
+    """Deduplicating, sorted OID collection that keeps OIDs as raw digests and spills to disk.
+
+    Entries are appended to one bytearray (40 bytes each, instead of a 64-character str in a set).
+    When the buffer fills it is sorted, deduplicated and written to a temp file as a run; iterating
+    merges the runs with heapq.merge, so memory stays at about one buffer however many OIDs there are.
+    """
+
+    def __init__(self, spill_mb=SPILL_MB):
+        self.limit = max(RECORD, (spill_mb << 20) // RECORD * RECORD)
+        self.buf = bytearray()
+        self.runs = []
+
+    def add(self, digest, size=0):
+        self.buf += digest
+        self.buf += size.to_bytes(8, "big")
+        if len(self.buf) >= self.limit:
+            self.runs.append(self._spill())
+
+    def add_run(self, run):
+        """Merge in a binary file of records already sorted and deduplicated (as written by save())."""
+        self.runs.append(run)
+
+    def save(self, path):
+        """Yield (hex OID, size) like iteration, also writing the records to path when done."""
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as out:
+            for digest, size in self.records():
+                out.write(digest + size.to_bytes(8, "big"))
+                yield digest.hex(), size
+        os.replace(tmp, path)
+
+    def _sorted(self):
+        buf = bytes(self.buf)
+        self.buf = bytearray()
+        return sorted(buf[i:i + RECORD] for i in range(0, len(buf), RECORD))
+
+    def _spill(self):
+        run = tempfile.TemporaryFile()
+        run.writelines(dedup(self._sorted()))
+        run.seek(0)
+        return run
+
+    @staticmethod
+    def _read(run):
+        while True:
+            block = run.read(RECORD << 10)
+            if not block:
+                run.close()
+                return
+            for i in range(0, len(block), RECORD):
+                yield block[i:i + RECORD]
+
+    def records(self):
+        """Yield every distinct (digest, size) in OID order. Consumes the set."""
+        runs, self.runs = self.runs, []
+        for record in dedup(heapq.merge(self._sorted(), *map(self._read, runs))):
+            yield record[:32], int.from_bytes(record[32:], "big")
+
+    def __iter__(self):
+        """Yield every distinct (hex OID, size) in OID order. Consumes the set."""
+        for digest, size in self.records():
+            yield digest.hex(), size
+
+
+def dedup(records):
+    """Drop records whose digest repeats the previous one (records must be sorted)."""
+    previous = None
+    for record in records:
+        digest = record[:32]
+        if digest != previous:
+            previous = digest
+            yield record
+
+
+def scan(s, oids):
+    """Parse a `git cat-file --batch` stream, adding the digest and size of every LFS pointer blob
+    to the OidSet `oids`."""
+    while True:
+        hdr = s.readline()
+        if not hdr:
+            break
+        parts = hdr.split()
+        if len(parts) < 3:
+            continue
+        typ = parts[1]
+        size = int(parts[2])
+        data = s.read(size)
+        s.read(1)
+
+        if typ != b"blob" or size > MAX_POINTER_SIZE or not data.startswith(ver):
+            continue
+
+        for line in data.splitlines():
+            m = oid_re.match(line)
+            if m:
+                oids.add(binascii.unhexlify(m.group(1)), pointer_size(data))
+
+
+def pointer_size(data):
+    """The `size N` of a pointer body, or 0 if it is missing or malformed.
+
+    N must be plain decimal digits that fit OidSet's 8-byte size field; `size -1`, `size +5` or
+    an oversized value counts as malformed rather than aborting the scan.
+    """
+    i = data.find(SIZE_LINE)
+    if i < 0:
+        return 0
+    i += len(SIZE_LINE)
+    j = data.find(b"\n", i)
+    digits = data[i:j if j >= 0 else len(data)].rstrip(b"\r")
+    if not digits.isdigit():
+        return 0
+    size = int(digits)
+    return size if size < MAX_OBJECT_SIZE else 0
+
+
+def small_blobs(repo, revs=None):
+    """Yield IDs of blobs whose size could be an LFS pointer, using only object headers.
+
+    Every object in the repository by default; with revs (`rev-list --stdin` lines such as
+    "<tip>" and "^<old tip>"), only the objects rev-list walks from them.
+    """
+    cmd = ["git", "-C", repo, "cat-file", "--batch-check=%(objectname) %(objecttype) %(objectsize)", "--buffer"]
+    walk = None
+    if revs is None:
+        cmd += ["--batch-all-objects", "--unordered"]
+    else:
+        # Old tips may have been deleted and pruned since the last run; --ignore-missing skips them.
+        walk = subprocess.Popen(
+            ["git", "-C", repo, "rev-list", "--objects", "--no-object-names", "--ignore-missing", "--stdin"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+    check = subprocess.Popen(cmd, stdin=walk and walk.stdout, stdout=subprocess.PIPE)
+    if walk:
+        walk.stdout.close()  # cat-file owns the read end now
+        # rev-list reads all of stdin before it walks, so this cannot block on its output.
+        walk.stdin.write(b"".join(rev.encode() + b"\n" for rev in revs))
+        walk.stdin.close()
+    for line in check.stdout:
+        name, typ, size = line.split()
+        if typ == b"blob" and MIN_POINTER_SIZE <= int(size) <= MAX_POINTER_SIZE:
+            yield name
+    if walk and walk.wait() != 0:
+        sys.exit(f"git rev-list failed in {repo}")
+    if check.wait() != 0:
+        sys.exit(f"git cat-file --batch-check failed in {repo}")
+
+
+def ref_tips(repo):
+    """Sorted object IDs of every ref and HEAD: what `rev-list --all` starts from."""
+    refs = subprocess.run(["git", "-C", repo, "for-each-ref", "--format=%(objectname)"],
+                          stdout=subprocess.PIPE, text=True)
+    if refs.returncode != 0:
+        sys.exit(f"git for-each-ref failed in {repo}")
+    head = subprocess.run(["git", "-C", repo, "rev-parse", "--verify", "-q", "HEAD"],
+                          stdout=subprocess.PIPE, text=True)
+    return sorted(set(refs.stdout.split() + head.stdout.split()))
+
+
+def scan_incremental(repo, oids, state):
+    """Scan only objects reachable from refs that moved since the run recorded in state, and merge
+    the OIDs found then into oids. Returns the current tips, to be saved once oids is written.
+
+    OIDs are only ever added: pointers that become unreachable (deleted branches, rewritten
+    history) stay in the result until the state files are removed and a full scan is done.
+    """
+    old_tips = []
+    if os.path.exists(state):
+        with open(state) as f:
+            saved = json.load(f)
+        # Another repository's tips would be passed to rev-list as --not and hide this one's history.
+        if os.path.realpath(saved["repo"]) != os.path.realpath(repo):
+            sys.exit(f"{state} was written for {saved['repo']}, not {os.path.realpath(repo)}; "
+                     f"use one --state file per repository")
+        old_tips = saved["tips"]
+        if not os.path.exists(state + ".oids"):
+            sys.exit(f"{state}.oids is missing; remove {state} to rescan from scratch")
+        oids.add_run(open(state + ".oids", "rb"))
+    tips = ref_tips(repo)
+    new_tips = sorted(set(tips) - set(old_tips))
+    print(f"{len(new_tips)} of {len(tips)} ref tips changed since the last scan", file=sys.stderr)
+    if new_tips:
+        scan_repo(repo, oids, new_tips + ["^" + tip for tip in old_tips])
+    return tips
+
+
+def save_state(state, repo, tips):
+    tmp = state + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"repo": os.path.realpath(repo), "scanned_at": time.time(), "tips": tips}, f)
+    os.replace(tmp, state)
+
+
+def scan_repo(repo, oids, revs=None):
+    """Two-phase scan: pick small blobs from --batch-check, then read only those through one --batch process."""
+    batch = subprocess.Popen(
+        ["git", "-C", repo, "cat-file", "--batch", "--buffer"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+    )
+
+    # A writer thread feeds IDs while this thread drains the output, so neither pipe fills up and blocks.
+    failed = []
+
+    def feed():
+        try:
+            for name in small_blobs(repo, revs):
+                batch.stdin.write(name + b"\n")
+        except (SystemExit, OSError) as e:
+            failed.append(e)
+        finally:
+            batch.stdin.close()
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    scan(batch.stdout, oids)
+    writer.join()
+    if failed:
+        sys.exit(failed[0])
+    if batch.wait() != 0:
+        sys.exit(f"git cat-file --batch failed in {repo}")
+
+
+def storage_objects(root):
+    """Yield (oid, size) for every object under an LFS storage directory (root/xx/yy/<oid>) in OID order.
+
+    The xx/yy levels are OID prefixes, so sorting each directory listing sorts the whole walk and
+    only one leaf directory is held in memory at a time.
+    """
+    def subdirs(path):
+        return sorted(e.name for e in os.scandir(path) if e.is_dir() and len(e.name) == 2)
+
+    for xx in subdirs(root):
+        for yy in subdirs(os.path.join(root, xx)):
+            leaf = os.path.join(root, xx, yy)
+            prefix = xx + yy
+            for name, size in sorted((e.name, e.stat().st_size) for e in os.scandir(leaf) if e.is_file()):
+                # Skip temp files and anything else that isn't an object in the right place.
+                if len(name) == 64 and name.startswith(prefix) and not name.encode().translate(None, HEX):
+                    yield name, size
+
+
+def read_referenced(f):
+    """Yield (oid, size or None) from a sorted OID list, one per line with an optional size column."""
+    previous = ""
+    for lineno, line in enumerate(f, 1):
+        fields = line.split()
+        if not fields:
+            continue
+        oid = fields[0]
+        if oid <= previous:
+            if oid == previous:
+                continue
+            sys.exit(f"referenced OIDs must be sorted: line {lineno} ({oid}) comes after {previous}")
+        previous = oid
+        if len(fields) > 1 and not fields[1].isdigit():
+            sys.exit(f"line {lineno}: size {fields[1]!r} is not a number")
+        yield oid, int(fields[1]) if len(fields) > 1 else None
+
+
+def merge_join(referenced, stored):
+    """Merge two (oid, size) streams sorted by OID, yielding ("missing" | "orphaned", oid, size).
+
+    Missing objects are referenced but not stored (size from the pointer, when known); orphaned
+    objects are stored but not referenced (size on disk).
+    """
+    sentinel = (None, None)
+    ref, sto = next(referenced, sentinel), next(stored, sentinel)
+    while ref[0] is not None or sto[0] is not None:
+        if sto[0] is None or (ref[0] is not None and ref[0] < sto[0]):
+            yield "missing", ref[0], ref[1]
+            ref = next(referenced, sentinel)
+        elif ref[0] is None or sto[0] < ref[0]:
+            yield "orphaned", sto[0], sto[1]
+            sto = next(stored, sentinel)
+        else:
+            ref, sto = next(referenced, sentinel), next(stored, sentinel)
+
+
+def report_storage(referenced, root):
+    """Print one line per orphaned or missing object and a byte total per kind to stderr.
+
+    Missing bytes come from the referenced list's size column; objects without one are counted
+    but left out of the byte total rather than counted as 0 bytes.
+    """
+    counts = {"orphaned": [0, 0, 0], "missing": [0, 0, 0]}  # objects, bytes, objects with a size
+    for kind, oid, size in merge_join(referenced, storage_objects(root)):
+        counts[kind][0] += 1
+        if size is not None:
+            counts[kind][1] += size
+            counts[kind][2] += 1
+        print(f"{kind}\t{oid}\t{'' if size is None else size}")
+    orphaned, missing = counts["orphaned"], counts["missing"]
+    print(f"orphaned: {orphaned[0]} objects, {orphaned[1]} bytes reclaimable", file=sys.stderr)
+    if missing[2] == missing[0]:
+        print(f"missing: {missing[0]} objects, {missing[1]} bytes (per pointer)", file=sys.stderr)
+    elif not missing[2]:
+        print(f"missing: {missing[0]} objects (sizes unknown: save the referenced list with --sizes)",
+              file=sys.stderr)
+    else:
+        print(f"missing: {missing[0]} objects, {missing[1]} bytes for the {missing[2]} with a size (per pointer)",
+              file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the sorted LFS OIDs referenced by pointer blobs")
+    parser.add_argument("--repo", help="Scan this repository with git directly instead of reading "
+                                       "`git cat-file --batch` output from stdin")
+    parser.add_argument("--storage", metavar="DIR",
+                        help="Instead of printing OIDs, diff them against this LFS storage directory "
+                             "(xx/yy/<oid> layout) and print orphaned and missing objects with sizes")
+    parser.add_argument("--referenced", metavar="FILE",
+                        help="With --storage: read the sorted referenced OIDs (as printed by this script, "
+                             "with --sizes for byte totals) from FILE ('-' for stdin) instead of scanning")
+    parser.add_argument("--sizes", action="store_true",
+                        help="Print `<oid> <size>` lines, with the size from the pointer, instead of bare OIDs")
+    parser.add_argument("--state", metavar="FILE",
+                        help="With --repo: keep ref tips in FILE and the OIDs found in FILE.oids, and on later "
+                             "runs only walk history added since; output is still the full OID list")
+    parser.add_argument("--spill-mb", type=int, default=SPILL_MB, metavar="MB",
+                        help="Memory for collected OIDs before sorted runs spill to temp files "
+                             "(default: %(default)s, about 40 bytes per OID)")
+    args = parser.parse_args()
+
+    if args.referenced and not args.storage:
+        parser.error("--referenced only makes sense with --storage")
+    if args.state and not args.repo:
+        parser.error("--state needs --repo")
+    if args.storage and not os.path.isdir(args.storage):
+        sys.exit(f"LFS storage directory not found: {args.storage}")
+
+    if args.referenced:
+        with (sys.stdin if args.referenced == "-" else open(args.referenced)) as f:
+            report_storage(read_referenced(f), args.storage)
+        return
+
+    oids = OidSet(args.spill_mb)
+    if args.state:
+        tips = scan_incremental(args.repo, oids, args.state)
+        found = oids.save(args.state + ".oids")
+    elif args.repo:
+        scan_repo(args.repo, oids)
+        found = iter(oids)
+    else:
+        scan(sys.stdin.buffer, oids)
+        found = iter(oids)
+
+    if args.storage:
+        report_storage(found, args.storage)
+    else:
+        write = sys.stdout.write
+        if args.sizes:
+            for oid, size in found:
+                write(f"{oid} {size}\n")
+        else:
+            for oid, _ in found:
+                write(oid + "\n")
+    if args.state:
+        save_state(args.state, args.repo, tips)
+
+
+if __name__ == "__main__":
+    main()
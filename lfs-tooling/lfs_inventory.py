@@ -0,0 +1,164 @@
+# Inventory the LFS objects referenced by many repositories at once.
+# Usage (copy extract_lfs_oids.py next to this script):
+# $ python3 /tmp/lfs_inventory.py --index /tmp/lfs.db --root /data/user/repositories --jobs 8
+# $ python3 /tmp/lfs_inventory.py --index /tmp/lfs.db --repos-from repos.txt
+#
+# Then query the index without rescanning:
+# $ python3 /tmp/lfs_inventory.py --index /tmp/lfs.db --which <OID>
+# $ python3 /tmp/lfs_inventory.py --index /tmp/lfs.db --bytes-per-repo
+#
+# Rescanning a repository replaces its rows; the others are left alone.
+
+import argparse, os, re, sqlite3, sys, tempfile, time
+from multiprocessing import Pool
+
+from extract_lfs_oids import OidSet, scan_repo
+
+OID_RE = re.compile(r"^[0-9a-f]{64}$")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    scanned_at REAL NOT NULL
+);
+-- One row per (object, repository). OIDs are stored as 32 raw bytes, sizes come from the pointer.
+CREATE TABLE IF NOT EXISTS pointers (
+    oid BLOB NOT NULL,
+    repo INTEGER NOT NULL REFERENCES repos (id),
+    size INTEGER NOT NULL,
+    PRIMARY KEY (oid, repo)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pointers_repo ON pointers (repo);
+"""
+
+
+def find_repos(root):
+    """Bare repositories (directories named *.git) under root, without descending into them."""
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames.sort()
+        for name in [d for d in dirnames if d.endswith(".git")]:
+            dirnames.remove(name)
+            yield os.path.realpath(os.path.join(dirpath, name))
+
+
+def scan_one(repo):
+    """Pool worker: (repo, records file, record count, error, seconds).
+
+    The records go to a temp file (as written by OidSet.save) rather than back through the pool,
+    so neither process holds a whole repository's OIDs in memory. The caller removes the file.
+    """
+    started = time.perf_counter()
+    oids = OidSet()
+    try:
+        scan_repo(repo, oids)
+    except SystemExit as e:  # a SystemExit escaping a pool worker would hang the pool
+        return repo, None, 0, str(e.code), time.perf_counter() - started
+    fd, path = tempfile.mkstemp(prefix="lfs_inventory.", suffix=".oids")
+    os.close(fd)
+    count = sum(1 for _ in oids.save(path))
+    return repo, path, count, None, time.perf_counter() - started
+
+
+def saved_records(path):
+    """Stream the (oid bytes, size) records scan_one saved to path."""
+    oids = OidSet()
+    oids.add_run(open(path, "rb"))
+    return oids.records()
+
+
+def open_index(path):
+    try:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+    except sqlite3.Error as e:
+        sys.exit(f"Could not open index {path}: {e}")
+    return conn
+
+
+def store(conn, repo, rows):
+    repo = os.path.realpath(repo)
+    with conn:
+        conn.execute("INSERT INTO repos (path, scanned_at) VALUES (?, ?) "
+                     "ON CONFLICT (path) DO UPDATE SET scanned_at = excluded.scanned_at", (repo, time.time()))
+        repo_id = conn.execute("SELECT id FROM repos WHERE path = ?", (repo,)).fetchone()[0]
+        conn.execute("DELETE FROM pointers WHERE repo = ?", (repo_id,))
+        conn.executemany("INSERT INTO pointers (oid, repo, size) VALUES (?, ?, ?)",
+                         ((oid, repo_id, size) for oid, size in rows))
+
+
+def build(conn, repos, jobs):
+    failed = 0
+    with Pool(jobs) as pool:
+        for done, (repo, path, count, error, elapsed) in enumerate(pool.imap_unordered(scan_one, repos), 1):
+            if error:
+                failed += 1
+                print(f"[{done}/{len(repos)}] {repo}: {error}", file=sys.stderr)
+                continue
+            try:
+                store(conn, repo, saved_records(path))
+            finally:
+                os.remove(path)
+            print(f"[{done}/{len(repos)}] {repo}: {count} oids in {elapsed:.1f}s", file=sys.stderr)
+    if failed:
+        print(f"{failed} of {len(repos)} repositories failed to scan", file=sys.stderr)
+    return failed
+
+
+def which(conn, oid):
+    """Repositories referencing oid, with the size their pointer records."""
+    return conn.execute(
+        "SELECT r.path, p.size FROM pointers p JOIN repos r ON r.id = p.repo WHERE p.oid = ? ORDER BY r.path",
+        (bytes.fromhex(oid),)).fetchall()
+
+
+def bytes_per_repo(conn):
+    """(path, objects, bytes) for every indexed repository, largest first."""
+    return conn.execute(
+        "SELECT r.path, COUNT(p.oid), COALESCE(SUM(p.size), 0) AS total FROM repos r "
+        "LEFT JOIN pointers p ON p.repo = r.id GROUP BY r.id ORDER BY total DESC, r.path").fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the LFS OIDs referenced by many repositories")
+    parser.add_argument("repos", nargs="*", help="Repositories to scan")
+    parser.add_argument("--index", default="lfs_inventory.db", help="SQLite index file (default: %(default)s)")
+    parser.add_argument("--root", help="Scan every bare repository (*.git) under this directory")
+    parser.add_argument("--repos-from", metavar="FILE", help="Scan the repositories listed in FILE, one per line "
+                                                             "('-' for stdin)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Repositories scanned in parallel "
+                                                                         "(default: one per CPU)")
+    parser.add_argument("--which", metavar="OID", help="List the repositories that reference OID")
+    parser.add_argument("--bytes-per-repo", action="store_true",
+                        help="Print referenced objects and LFS bytes per repository")
+    args = parser.parse_args()
+
+    if args.which and not OID_RE.match(args.which):
+        sys.exit(f"--which expects a 64-character sha256 OID, got {args.which!r}")
+
+    # Paths are stored resolved, so ./repo.git, /abs/repo.git and symlinks to it share one entry
+    repos = [os.path.realpath(repo) for repo in args.repos]
+    if args.root:
+        repos.extend(find_repos(args.root))
+    if args.repos_from:
+        with (sys.stdin if args.repos_from == "-" else open(args.repos_from)) as f:
+            repos.extend(os.path.realpath(line.strip()) for line in f if line.strip())
+    if not repos and not args.which and not args.bytes_per_repo:
+        parser.error("give repositories to scan (REPO, --root or --repos-from) or a query")
+
+    conn = open_index(args.index)
+    failed = build(conn, list(dict.fromkeys(repos)), max(1, args.jobs)) if repos else 0
+
+    if args.which:
+        for path, size in which(conn, args.which):
+            print(f"{path}\t{size}")
+    if args.bytes_per_repo:
+        for path, objects, total in bytes_per_repo(conn):
+            print(f"{path}\t{objects}\t{total}")
+    conn.close()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Tests for extract_lfs_oids.py: python -m pytest -q lfs-tooling"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract_lfs_oids import OidSet, read_referenced, report_storage, scan, scan_incremental, ver  # noqa: E402
+
+
+def batch(*bodies):
+    """A cat-file --batch stream with one blob per body."""
+    out = io.BytesIO()
+    for i, data in enumerate(bodies):
+        name = hashlib.sha1(str(i).encode()).hexdigest().encode()
+        out.write(b"%s blob %d\n%s\n" % (name, len(data), data))
+    return io.BytesIO(out.getvalue())
+
+
+def pointer(n, size_line):
+    oid = hashlib.sha256(str(n).encode()).hexdigest()
+    return oid, b"%s\noid sha256:%s\n%s\n" % (ver, oid.encode(), size_line)
+
+
+def test_malformed_sizes_are_recorded_as_zero():
+    cases = [b"size 123", b"size -1", b"size 18446744073709551616", b"size +5", b"size 12abc", b"size 7"]
+    pointers = [pointer(n, size_line) for n, size_line in enumerate(cases)]
+    oids = OidSet()
+    scan(batch(*(data for _, data in pointers)), oids)
+
+    sizes = dict(oids)
+    assert sizes == {
+        pointers[0][0]: 123, pointers[1][0]: 0, pointers[2][0]: 0,
+        pointers[3][0]: 0, pointers[4][0]: 0, pointers[5][0]: 7,
+    }
+
+
+def test_largest_size_fits():
+    oid, data = pointer(0, b"size 18446744073709551615")
+    oids = OidSet()
+    scan(batch(data), oids)
+    assert dict(oids) == {oid: (1 << 64) - 1}
+
+
+def test_missing_bytes_need_sizes(tmp_path, capsys):
+    stored = hashlib.sha256(b"stored").hexdigest()
+    (tmp_path / stored[:2] / stored[2:4]).mkdir(parents=True)
+    (tmp_path / stored[:2] / stored[2:4] / stored).write_bytes(b"x" * 10)
+    missing = sorted(hashlib.sha256(b"%d" % i).hexdigest() for i in range(2))
+
+    report_storage(read_referenced(io.StringIO(f"{missing[0]} 100\n{missing[1]} 50\n")), str(tmp_path))
+    assert capsys.readouterr().err.splitlines() == [
+        "orphaned: 1 objects, 10 bytes reclaimable",
+        "missing: 2 objects, 150 bytes (per pointer)",
+    ]
+
+    report_storage(read_referenced(io.StringIO("\n".join(missing) + "\n")), str(tmp_path))
+    assert capsys.readouterr().err.splitlines()[1] == \
+        "missing: 2 objects (sizes unknown: save the referenced list with --sizes)"
+
+
+def test_state_from_another_repository_is_refused(tmp_path):
+    state = tmp_path / "state.json"
+    state.write_text(json.dumps({"repo": str(tmp_path / "other.git"), "tips": ["0" * 40]}))
+    (tmp_path / "state.json.oids").write_bytes(b"")
+    (tmp_path / "this.git").mkdir()
+
+    with pytest.raises(SystemExit, match="was written for .*other.git"):
+        scan_incremental(str(tmp_path / "this.git"), OidSet(), str(state))
@@ -0,0 +1,50 @@
+"""Tests for lfs_inventory.py: python -m pytest -q lfs-tooling"""
+
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from extract_lfs_oids import ver  # noqa: E402
+from lfs_inventory import build, bytes_per_repo, open_index, which  # noqa: E402
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+
+
+def make_repo(path, count):
+    """A bare repository with one commit holding count LFS pointers; returns their (hex OID, size)."""
+    work = path.parent / (path.name + ".work")
+    subprocess.run(["git", "init", "-q", str(work)], check=True)
+    pointers = []
+    for n in range(count):
+        oid = hashlib.sha256(b"%d" % n).hexdigest()
+        (work / f"f{n}.bin").write_bytes(b"%s\noid sha256:%s\nsize %d\n" % (ver, oid.encode(), n + 1))
+        pointers.append((oid, n + 1))
+    git = ["git", "-C", str(work), "-c", "user.name=t", "-c", "user.email=t@t"]
+    subprocess.run(git + ["add", "."], check=True)
+    subprocess.run(git + ["commit", "-q", "-m", "pointers"], check=True)
+    subprocess.run(["git", "clone", "-q", "--bare", str(work), str(path)], check=True)
+    return sorted(pointers)
+
+
+def test_same_repository_by_any_path_is_one_entry(tmp_path, monkeypatch):
+    pointers = make_repo(tmp_path / "repo.git", 3)
+    os.symlink(tmp_path / "repo.git", tmp_path / "link.git")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))  # inherited by the forked pool workers
+    conn = open_index(str(tmp_path / "index.db"))
+
+    assert build(conn, ["repo.git"], 1) == 0
+    assert build(conn, [str(tmp_path / "link.git")], 1) == 0
+
+    path = os.path.realpath(tmp_path / "repo.git")
+    assert bytes_per_repo(conn) == [(path, 3, 6)]
+    for oid, size in pointers:
+        assert which(conn, oid) == [(path, size)]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".oids")]